@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#	This file is part of mdview.py
+#
+#	Copyright (c) 2013 Christian Schmitz <tynn.dev@gmail.com>
+#
+#	mdview.py is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	mdview.py is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with mdview.py. If not, see <http://www.gnu.org/licenses/>.
+
+import itertools, json, os, platform, re, select, shutil, socket, subprocess, sys, tempfile, time
+from codecs import open
+from mdview_core import __version__, BlockRenderer, MarkdownOptions, RenderCache, TextFile, create_markdown, markdown_version
+
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+def _table (i) :
+	rows = ["| {0} | cell {1} | `code {1}` | **{2}** |".format(i, j, i * j) for j in range(20)]
+	return "| id | name | code | value |\n|----|------|------|-------|\n" + "\n".join(rows)
+
+def _list (i) :
+	return "\n".join("{0}* item {1}.{2} with *emphasis*".format("    " * (j % 6), i, j) for j in range(30))
+
+def _code (i) :
+	return "\n".join("    def function_{0}_{1} (self, value) : return value * {1}".format(i, j) for j in range(200))
+
+def _links (i) :
+	links = " ".join("[link {0}](http://example.com/{1}/{0} \"title\")".format(j, i) for j in range(10))
+	references = " ".join("[ref {0}][r{1}-{0}]".format(j, i) for j in range(10))
+	definitions = "\n".join("[r{1}-{0}]: http://example.org/{1}/{0}".format(j, i) for j in range(10))
+	return links + "\n" + references + "\n\n" + definitions
+
+def _text (i) :
+	return "Paragraph {0} with *emphasis*, __strong text__, `inline code` and an <http://example.net/{0}> autolink. ".format(i) * 4
+
+GENERATORS = {'tables': _table, 'lists': _list, 'code': _code, 'links': _links, 'text': _text}
+
+
+def corpus (kind, size) :
+	generators = [GENERATORS[key] for key in sorted(GENERATORS)] if kind == 'mixed' else [GENERATORS[kind]]
+	parts, length = [], 0
+	for i in itertools.count() :
+		if length >= size : break
+		part = "## Section {0}\n\n{1}".format(i, generators[i % len(generators)](i))
+		parts.append(part)
+		length += len(part) + 2
+	return "\n\n".join(parts)
+
+
+def parse_size (size) :
+	units = {'K': 1024, 'M': 1024 * 1024}
+	size = size.strip().upper().rstrip('B')
+	if size[-1:] in units : return int(float(size[:-1]) * units[size[-1]])
+	return int(size)
+
+
+def option_sets (mode) :
+	defaults = dict(MarkdownOptions.DEFAULTS)
+	if mode == 'default' : return [defaults]
+	keys = ['output_format', 'safe_mode']
+	if mode == 'all' : keys += ['enable_attributes', 'smart_emphasis', 'lazy_ol', 'highlight']
+	values = [getattr(MarkdownOptions, key) if key in ('output_format', 'safe_mode') else (True, False) for key in keys]
+	return [dict(defaults, **dict(zip(keys, combination))) for combination in itertools.product(*values)]
+
+
+
+class Benchmark (object) :
+
+	def __init__ (self, repeat) :
+		self.repeat = repeat
+		self.results = []
+
+	def record (self, phase, seconds, **info) :
+		result = dict(info, phase = phase)
+		if seconds :
+			seconds = sorted(seconds)
+			result.update(seconds = seconds, min = seconds[0], median = seconds[len(seconds) // 2])
+		self.results.append(result)
+		sys.stderr.write("{0} {1}: {2}\n".format(phase, json.dumps(info, sort_keys = True), "{0:.4f} s".format(result['min']) if seconds else info.get('skipped')))
+
+	def time (self, phase, function, **info) :
+		seconds = []
+		for run in range(self.repeat) :
+			start = _clock()
+			function()
+			seconds.append(_clock() - start)
+		self.record(phase, seconds, **info)
+
+	def run_pipeline (self, path, text, options, **info) :
+		info = dict(info, options = options)
+		md = create_markdown(options)
+		self.time('convert', lambda : md.reset().convert(text), **info)
+		renderer = BlockRenderer(md, options)
+		self.time('convert_blocks', lambda : BlockRenderer(md, options).convert(text), **info)
+		renderer.convert(text)
+		middle = text.find("## Section", len(text) // 2)
+		edits = [text[:middle] + "Edited paragraph {0}.\n\n".format(run) + text[middle:] for run in range(self.repeat)]
+		self.time('convert_edit', lambda : renderer.convert(edits.pop()), **info)
+
+	def run_read (self, path, **info) :
+		def read () :
+			with TextFile(path) as f :
+				f.digest()
+				f.decode()
+		self.time('read', read, **info)
+
+	def run_webview (self, path, html, **info) :
+		try :
+			import mdview
+			from gi.repository import Gio, GLib, Gtk
+			if not Gtk.init_check(sys.argv[:1])[0] : raise RuntimeError("no display")
+		except Exception as e :
+			self.record('load', None, skipped = str(e), **info)
+			self.record('reload', None, skipped = str(e), **info)
+			return
+
+		loop = GLib.MainLoop()
+		window = Gtk.OffscreenWindow()
+		webview = mdview.WebView()
+		window.set_default_size(800, 600)
+		window.add(webview)
+		window.show_all()
+		webview.connect('document-load-finished', lambda *args : loop.quit())
+		seconds = []
+		for run in range(self.repeat) :
+			start = _clock()
+			webview.load_string(html, "text/html", "utf-8", "file://" + path)
+			loop.run()
+			seconds.append(_clock() - start)
+		window.destroy()
+		self.record('load', seconds, **info)
+
+		application = mdview.Application()
+		application.set_flags(application.get_flags() | Gio.ApplicationFlags.NON_UNIQUE)
+		application.register(None)
+		application.cache = RenderCache(tempfile.mkdtemp())
+		view = mdview.MdView(application)
+		on_rendered = view._on_rendered
+		def rendered (*args) :
+			on_rendered(*args)
+			GLib.idle_add(loop.quit, priority = GLib.PRIORITY_LOW)
+		view._on_rendered = rendered
+		view.show_all()
+		view.load(path)
+		loop.run()
+		while view.webview.get_load_status() != mdview.WebKit.LoadStatus.FINISHED : GLib.MainContext.default().iteration(True)
+		with open(path, 'r', 'utf-8') as f : text = f.read()
+		middle = text.find("## Section", len(text) // 2)
+		seconds = []
+		for run in range(self.repeat) :
+			timeout = GLib.timeout_add_seconds(60, loop.quit)
+			start = _clock()
+			with open(path, 'w', 'utf-8') as f : f.write(text[:middle] + "Edited paragraph {0}.\n\n".format(run) + text[middle:])
+			loop.run()
+			seconds.append(_clock() - start)
+			GLib.source_remove(timeout)
+		view.destroy()
+		self.record('reload', seconds, reload_delay = view.reload_delay, **info)
+		shutil.rmtree(application.cache.path, True)
+
+	def run_serve (self, path, clients, **info) :
+		info = dict(info, clients = clients)
+		try :
+			server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "mdview.py"), "serve", "--port", "0", path], stderr = subprocess.PIPE)
+			match = re.search(r'http://([^/]+):(\d+)/', server.stderr.readline().decode('utf-8', 'replace'))
+			if not match : raise RuntimeError("server did not start")
+		except Exception as e :
+			self.record('push', None, skipped = str(e), **info)
+			return
+		try :
+			request = "GET /{0}?events=1 HTTP/1.1\r\n\r\n".format(os.path.basename(path)).encode('ascii')
+			sockets = []
+			for client in range(clients) :
+				sock = socket.create_connection((match.group(1), int(match.group(2))))
+				sock.sendall(request)
+				sockets.append(sock)
+			for sock in sockets :
+				head = b''
+				while b"\n\n" not in head : head += sock.recv(4096)
+			with open(path, 'r', 'utf-8') as f : text = f.read()
+			middle = text.find("## Section", len(text) // 2)
+			seconds, latencies, cpu = [], [], 0
+			for run in range(self.repeat) :
+				marker = "Edited paragraph {0}.".format(run).encode('utf-8')
+				used = self._cpu(server.pid)
+				start = _clock()
+				with open(path, 'w', 'utf-8') as f : f.write(text[:middle] + "Edited paragraph {0}.\n\n".format(run) + text[middle:])
+				received = self._receive(sockets, marker, start)
+				cpu += self._cpu(server.pid) - used
+				seconds.append(max(received))
+				latencies.extend(received)
+			latencies.sort()
+			for sock in sockets : sock.close()
+			self.record('push', seconds, first = latencies[0], median_client = latencies[len(latencies) // 2], cpu = cpu / self.repeat, clients_per_core = clients * self.repeat / cpu if cpu else None, **info)
+		except Exception as e : self.record('push', None, skipped = str(e), **info)
+		finally :
+			server.terminate()
+			server.wait()
+
+	def _receive (self, sockets, marker, start) :
+		poll, buffers, received = select.poll(), {}, {}
+		for sock in sockets :
+			poll.register(sock, select.POLLIN)
+			buffers[sock.fileno()] = b''
+		while len(received) < len(sockets) :
+			events = poll.poll(60000)
+			if not events : raise RuntimeError("timed out waiting for {0} clients".format(len(sockets) - len(received)))
+			for fd, event in events :
+				data = os.read(fd, 1024 * 1024)
+				if not data : raise RuntimeError("server closed a connection")
+				buffers[fd] += data
+				if buffers[fd].endswith(b"\n\n") and marker in buffers[fd] :
+					received[fd] = _clock() - start
+					poll.unregister(fd)
+		return list(received.values())
+
+	def _cpu (self, pid) :
+		try :
+			with open("/proc/{0}/stat".format(pid), 'r') as f : fields = f.read().rsplit(')', 1)[1].split()
+			return (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK'))
+		except (IOError, OSError, ValueError) : return 0
+
+	def dump (self, out) :
+		json.dump({
+			'version': __version__,
+			'markdown': markdown_version(),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'time': time.time(),
+			'repeat': self.repeat,
+			'results': self.results,
+		}, out, indent = 1, sort_keys = True)
+		out.write("\n")
+
+
+
+def main () :
+	import argparse
+	parser = argparse.ArgumentParser(description = "Benchmark the read, convert and display pipeline of mdview.py.")
+	parser.add_argument('--kinds', default = "mixed,tables,lists,code,links", help = "comma separated corpus kinds: mixed, " + ", ".join(sorted(GENERATORS)))
+	parser.add_argument('--sizes', default = "1K,100K,1M", help = "comma separated corpus sizes, e.g. 1K,10M,100M")
+	parser.add_argument('--options', default = 'default', choices = ['default', 'matrix', 'all'], help = "Markdown options to convert with: the defaults, every output format and safe mode or every combination")
+	parser.add_argument('--repeat', type = int, default = 3, help = "runs per measurement")
+	parser.add_argument('--webview', action = 'store_true', help = "also time WebKit loading and live reloads, needs a display such as Xvfb")
+	parser.add_argument('--serve', metavar = 'CLIENTS', help = "also time pushing live reloads from mdview.py serve to comma separated numbers of SSE clients, e.g. 1,100,500")
+	parser.add_argument('-o', '--output', help = "write the JSON results to this file instead of stdout")
+	args = parser.parse_args()
+
+	benchmark = Benchmark(max(1, args.repeat))
+	directory = tempfile.mkdtemp()
+	try :
+		for kind in args.kinds.split(',') :
+			for size in map(parse_size, args.sizes.split(',')) :
+				path = os.path.join(directory, "{0}-{1}.md".format(kind, size))
+				text = corpus(kind, size)
+				with open(path, 'w', 'utf-8') as f : f.write(text)
+				benchmark.run_read(path, kind = kind, size = size)
+				for options in option_sets(args.options) : benchmark.run_pipeline(path, text, options, kind = kind, size = size)
+				if args.webview :
+					html = BlockRenderer(create_markdown(MarkdownOptions.DEFAULTS), MarkdownOptions.DEFAULTS).convert(text)
+					benchmark.run_webview(path, html, kind = kind, size = size)
+				if args.serve :
+					for clients in map(int, args.serve.split(',')) : benchmark.run_serve(path, clients, kind = kind, size = size)
+	finally : shutil.rmtree(directory, True)
+
+	if args.output :
+		with open(args.output, 'w', 'utf-8') as f : benchmark.dump(f)
+	else : benchmark.dump(sys.stdout)
+
+if __name__ == '__main__' : main()
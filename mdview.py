@@ -17,19 +17,27 @@
 #	You should have received a copy of the GNU General Public License
 #	along with mdview.py. If not, see <http://www.gnu.org/licenses/>.
 
-__appname__ = "mdview.py"
-__version__ = "1.0b"
-__author__ = "Christian Schmitz"
-__author_email__ = "tynn.dev@gmail.com"
-__url__ = "https://github.com/tynn/mdview-py"
+import time
+_started = time.time()
 
-
-import os, sys
-from codecs import open
+import os, sys, threading
+try : import queue
+except ImportError : import Queue as queue
 from gettext import gettext as _
-from gi.repository import Gdk, Gio, Gtk, WebKit
-from markdown import Markdown
-from subprocess import Popen
+from mdview_core import __appname__, __version__, __author__, __author_email__, __url__, SCHEMA, AssetCache, BlockRenderer, BlockSplitter, EnginePool, FileTooLarge, FileWatcher, MarkdownOptions, RecentRenders, RenderCache, SearchIndex, StageProfiler, StreamReader, TextFile, Timings, Workspace, create_markdown, default_highlighter, is_stream, local_markdown_path, markdown_links, memory_usage, option_variants, options_key, settings, settings_options, trim_memory, write_atomic
+if __name__ == '__main__' and sys.argv[1:2] == ['export'] :
+	from mdview_core import export_main
+	sys.exit(export_main(sys.argv[2:]))
+if __name__ == '__main__' and sys.argv[1:2] == ['profile'] :
+	from mdview_core import profile_main
+	sys.exit(profile_main(sys.argv[2:]))
+if __name__ == '__main__' and sys.argv[1:2] == ['serve'] :
+	from mdview_core import serve_main
+	sys.exit(serve_main(sys.argv[2:]))
+if __name__ == '__main__' and sys.argv[1:2] == ['--watch-export'] :
+	from mdview_core import watch_export_main
+	sys.exit(watch_export_main(sys.argv[2:]))
+from gi.repository import Gdk, Gio, GLib, Gtk, Pango, WebKit
 try : from urllib.parse import unquote, urlparse
 except :
 	from urllib import unquote
@@ -45,32 +53,6 @@ def _stock (stock_id, mnemonic = True) :
 def _true (*args) : return True
 
 
-
-class MarkdownOptions (object) :
-
-	KEYS = ('output_format', 'safe_mode', 'html_replacement_text', 'tab_length', 'enable_attributes', 'smart_emphasis', 'lazy_ol')
-
-	output_format = ('xhtml1', 'xhtml5', 'html4', 'html5')
-	safe_mode = (False, 'replace', 'remove', 'escape')
-	html_replacement_text = str
-	tab_length = int
-	enable_attributes = bool
-	smart_emphasis = bool
-	lazy_ol = bool
-
-	def set (self, key, value) :
-		if key in MarkdownOptions.KEYS : setattr(self, key, value)
-
-	def dict (self, dict = None) :
-		if not dict : dict = {}
-		for key in MarkdownOptions.KEYS :
-			attr = getattr(MarkdownOptions, key)
-			value = getattr(self, key)
-			if bool == attr == type(value) or tuple == type(attr) and value in attr or value and attr == type(value) : dict[key] = value
-		return dict
-
-
-
 class Menu (object) :
 
 	UI = """
@@ -78,6 +60,8 @@ class Menu (object) :
 			<menubar name='MainMenu'>
 				<menu action='FileMenu'>
 					<menuitem action='FileOpen'/>
+					<menuitem action='FileOpenFolder'/>
+					<menuitem action='FileGoTo'/>
 					<separator/>
 					<menuitem action='FileRevertToSaved'/>
 					<menuitem action='FileExportHTML'/>
@@ -88,6 +72,7 @@ class Menu (object) :
 					<menuitem action='EditCopy'/>
 					<separator/>
 					<menuitem action='EditSelectAll'/>
+					<menuitem action='EditFind'/>
 					<separator/>
 					<menuitem action='EditPreferences'/>
 				</menu>
@@ -97,11 +82,14 @@ class Menu (object) :
 					<menuitem action='ViewZoom100'/>
 					<separator/>
 					<menuitem action='ViewViewSource'/>
+					<menuitem action='ViewTimings'/>
+					<menuitem action='ViewProfile'/>
 				</menu>
 				<menu action='MarkdownMenu'>
 					<menuitem action='MarkdownEnableAttributes'/>
 					<menuitem action='MarkdownSmartEmphasis'/>
 					<menuitem action='MarkdownLazyOl'/>
+					<menuitem action='MarkdownHighlight'/>
 					<separator/>
 					<menu action='MarkdownOutputFormatMenu'>
 						<menuitem action='MarkdownOutputFormatHTML5'/>
@@ -129,18 +117,23 @@ class Menu (object) :
 		default_action_group = Gtk.ActionGroup('default_actions')
 		self.document_action_group = Gtk.ActionGroup('document_actions')
 		self.selection_action_group = Gtk.ActionGroup('selection_actions')
+		self.workspace_action_group = Gtk.ActionGroup('workspace_actions')
 
 		self.document_action_group.set_sensitive(False)
 		self.selection_action_group.set_sensitive(False)
+		self.workspace_action_group.set_sensitive(False)
 
 		uimanager.insert_action_group(default_action_group)
 		uimanager.insert_action_group(self.document_action_group)
 		uimanager.insert_action_group(self.selection_action_group)
+		uimanager.insert_action_group(self.workspace_action_group)
 
 		self.action = {}
 
 		self._add_action('FileMenu', _stock(Gtk.STOCK_FILE), None, None, default_action_group)
 		self._add_action('FileOpen', None, None, Gtk.STOCK_OPEN, default_action_group, None)
+		self._add_action('FileOpenFolder', _("Open _Folder…"), None, None, default_action_group, "<Shift><Control>O")
+		self._add_action('FileGoTo', _("_Go to File…"), None, Gtk.STOCK_JUMP_TO, self.workspace_action_group, "<Control>P")
 		self._add_action('FileExportHTML', _("_Export HTML"), None, None, self.document_action_group, "<Shift><Control>E")
 		self._add_action('FileRevertToSaved', None, None, Gtk.STOCK_REVERT_TO_SAVED, self.document_action_group, None)
 		self._add_action('FileQuit', None, None, Gtk.STOCK_QUIT, default_action_group, None)
@@ -148,6 +141,7 @@ class Menu (object) :
 		self._add_action('EditMenu', _stock(Gtk.STOCK_EDIT), None, None, default_action_group)
 		self._add_action('EditCopy', None, None, Gtk.STOCK_COPY, self.selection_action_group, None)
 		self._add_action('EditSelectAll', None, None, Gtk.STOCK_SELECT_ALL, self.document_action_group, "<Control>A")
+		self._add_action('EditFind', None, None, Gtk.STOCK_FIND, default_action_group, "<Control>F")
 		self._add_action('EditPreferences', None, None, Gtk.STOCK_PREFERENCES, default_action_group)
 
 		self._add_action('ViewMenu', _("_View"), None, None, default_action_group)
@@ -155,11 +149,14 @@ class Menu (object) :
 		self._add_action('ViewZoomOut', None, None, Gtk.STOCK_ZOOM_OUT, self.document_action_group, "<Control>minus")
 		self._add_action('ViewZoom100', None, None, Gtk.STOCK_ZOOM_100, self.document_action_group, "<Control>0")
 		self._add_action('ViewViewSource', _("_View source"), None, None, self.document_action_group, "<Control>U", Gtk.ToggleAction)
+		self._add_action('ViewTimings', _("Show _timings"), None, None, default_action_group, Action = Gtk.ToggleAction)
+		self._add_action('ViewProfile', _("_Profile conversion"), None, None, default_action_group, Action = Gtk.ToggleAction)
 
 		self._add_action('MarkdownMenu', _("_Markdown"), None, None, default_action_group)
 		self._add_action('MarkdownEnableAttributes', _("E_nable attributes"), None, None, default_action_group, Action = Gtk.ToggleAction)
 		self._add_action('MarkdownSmartEmphasis', _("S_mart emphasis"), None, None, default_action_group, Action = Gtk.ToggleAction)
 		self._add_action('MarkdownLazyOl', _("_Lazy ol"), None, None, default_action_group, Action = Gtk.ToggleAction)
+		self._add_action('MarkdownHighlight', _("_Highlight code"), None, None, default_action_group, Action = Gtk.ToggleAction)
 
 		self._add_action('MarkdownOutputFormatMenu', _("_Output format"), None, None, default_action_group)
 		group = self._add_action('MarkdownOutputFormatHTML5', "HTML _5", None, None, default_action_group, Action = Gtk.RadioAction, args = [3])
@@ -193,14 +190,20 @@ class Menu (object) :
 
 	def set_selection_available (self, available) : self.selection_action_group.set_sensitive(available)
 
+	def set_workspace_available (self, available) : self.workspace_action_group.set_sensitive(available)
+
 	def set_view_source (self, view_source) : self.action['ViewViewSource'].set_active(bool(view_source))
 
+	def set_show_timings (self, show_timings) : self.action['ViewTimings'].set_active(bool(show_timings))
+
 	def set_enable_attributes (self, enable_attributes) : self.action['MarkdownEnableAttributes'].set_active(bool(enable_attributes))
 
 	def set_smart_emphasis (self, smart_emphasis) : self.action['MarkdownSmartEmphasis'].set_active(bool(smart_emphasis))
 
 	def set_lazy_ol (self, lazy_ol) : self.action['MarkdownLazyOl'].set_active(bool(lazy_ol))
 
+	def set_highlight (self, highlight) : self.action['MarkdownHighlight'].set_active(bool(highlight))
+
 	def set_output_format (self, value) : self.action['MarkdownOutputFormatHTML4'].set_current_value(MarkdownOptions.output_format.index(value))
 
 	def set_safe_mode (self, value) : self.action['MarkdownSafeModeReplace'].set_current_value(MarkdownOptions.safe_mode.index(value))
@@ -221,6 +224,28 @@ class WebView (WebKit.WebView) :
 		self.props.settings.props.enable_java_applet = False
 		self.props.settings.props.enable_plugins = False
 
+	def limit_memory (self) :
+		self.set_maintains_back_forward_list(False)
+		self.props.settings.props.enable_page_cache = False
+		self.props.settings.props.enable_offline_web_application_cache = False
+		self.props.settings.props.enable_html5_database = False
+		self.props.settings.props.enable_html5_local_storage = False
+
+	def replace_blocks (self, start, stop, count, fragments) :
+		document = self.get_dom_document()
+		body = document.get_body()
+		children = body.get_children()
+		if children.get_length() != count : return False
+		nodes = [children.item(i) for i in range(start, stop)]
+		ref = children.item(stop) if stop < count else None
+		for node in nodes : body.remove_child(node)
+		for fragment in fragments :
+			div = document.create_element('div')
+			div.set_inner_html(fragment)
+			if ref : body.insert_before(div, ref)
+			else : body.append_child(div)
+		return True
+
 	def copy_clipboard (self, *args) : WebKit.WebView.copy_clipboard(self)
 
 	def select_all (self, *args) : WebKit.WebView.select_all(self)
@@ -244,6 +269,33 @@ class UriLabel (Gtk.Label) :
 
 
 
+class SourceView (Gtk.Paned) :
+
+	def __init__ (self) :
+		Gtk.Paned.__init__(self, orientation = Gtk.Orientation.HORIZONTAL)
+		self.markdown = self._text_view()
+		self.html = self._text_view()
+		self.pack1(self._scroller(self.markdown), True, True)
+		self.pack2(self._scroller(self.html), True, True)
+
+	def _text_view (self) :
+		text_view = Gtk.TextView()
+		text_view.set_editable(False)
+		text_view.set_cursor_visible(False)
+		text_view.override_font(Pango.FontDescription("monospace"))
+		return text_view
+
+	def _scroller (self, widget) :
+		scroller = Gtk.ScrolledWindow()
+		scroller.add(widget)
+		return scroller
+
+	def set_source (self, markdown, html) :
+		self.markdown.get_buffer().set_text(markdown)
+		self.html.get_buffer().set_text(html)
+
+
+
 class AboutDialog (Gtk.AboutDialog) :
 
 	def __init__ (self, parent) :
@@ -265,7 +317,7 @@ class AboutDialog (Gtk.AboutDialog) :
 
 class PreferencesDialog (Gtk.Dialog) :
 
-	SCHEMA = "apps.mdview-py"
+	SCHEMA = SCHEMA
 
 	def __init__ (self, parent) :
 		Gtk.Dialog.__init__(self, parent = parent, title = _stock(Gtk.STOCK_PREFERENCES, False))
@@ -279,6 +331,10 @@ class PreferencesDialog (Gtk.Dialog) :
 		enable_attributes = Gtk.CheckButton(_("Enable attributes"))
 		smart_emphasis = Gtk.CheckButton(_("Smart emphasis"))
 		lazy_ol = Gtk.CheckButton(_("Lazy ol"))
+		highlight = Gtk.CheckButton(_("Highlight code"))
+		highlight_style = Gtk.Entry()
+		reload_delay = Gtk.SpinButton()
+		change_detection = self._combo(FileWatcher.BACKENDS, {'auto': _("Poll network file systems for changes"), 'monitor': _("Monitor files for changes"), 'poll': _("Poll files for changes")})
 
 		output_format.connect('changed', self.on_state_changed, 'output_format')
 		safe_mode.connect('changed', self.on_state_changed, 'safe_mode')
@@ -287,6 +343,10 @@ class PreferencesDialog (Gtk.Dialog) :
 		enable_attributes.connect('toggled', self.on_state_changed, 'enable_attributes')
 		smart_emphasis.connect('toggled', self.on_state_changed, 'smart_emphasis')
 		lazy_ol.connect('toggled', self.on_state_changed, 'lazy_ol')
+		highlight.connect('toggled', self.on_state_changed, 'highlight')
+		highlight_style.connect('changed', self.on_highlight_style_changed)
+		reload_delay.connect('value-changed', self.on_reload_delay_changed)
+		change_detection.connect('changed', self.on_change_detection_changed)
 
 		# TODO layout
 		box = self.get_content_area()
@@ -297,6 +357,10 @@ class PreferencesDialog (Gtk.Dialog) :
 		box.pack_start(enable_attributes, False, False, False)
 		box.pack_start(smart_emphasis, False, False, False)
 		box.pack_start(lazy_ol, False, False, False)
+		box.pack_start(highlight, False, False, False)
+		box.pack_start(highlight_style, False, False, False)
+		box.pack_start(reload_delay, False, False, False)
+		box.pack_start(change_detection, False, False, False)
 		box.show_all()
 
 		self.md_options = MarkdownOptions()
@@ -304,8 +368,14 @@ class PreferencesDialog (Gtk.Dialog) :
 		self.md_options.enable_attributes = enable_attributes.get_active()
 		self.md_options.smart_emphasis = smart_emphasis.get_active()
 		self.md_options.lazy_ol = lazy_ol.get_active()
+		self.md_options.highlight = highlight.get_active()
+		self.md_options.highlight_style = highlight_style.get_text()
+
+		self.reload_delay = 100
+		self.change_detection = 'auto'
 
 		tab_length.set_adjustment(Gtk.Adjustment(4, 1, 24, 1, 4, 0))
+		reload_delay.set_adjustment(Gtk.Adjustment(100, 0, 5000, 50, 500, 0))
 
 		if self.SCHEMA in Gio.Settings.list_schemas() :
 			settings = Gio.Settings.new(self.SCHEMA)
@@ -316,6 +386,10 @@ class PreferencesDialog (Gtk.Dialog) :
 			settings.bind("enable-attributes", enable_attributes, 'active', Gio.SettingsBindFlags.DEFAULT)
 			settings.bind("smart-emphasis", smart_emphasis, 'active', Gio.SettingsBindFlags.DEFAULT)
 			settings.bind("lazy-ol", lazy_ol, 'active', Gio.SettingsBindFlags.DEFAULT)
+			settings.bind("highlight", highlight, 'active', Gio.SettingsBindFlags.DEFAULT)
+			settings.bind("highlight-style", highlight_style, 'text', Gio.SettingsBindFlags.DEFAULT)
+			settings.bind("reload-delay", reload_delay, "value", Gio.SettingsBindFlags.DEFAULT)
+			settings.bind("change-detection", change_detection, 'active-id', Gio.SettingsBindFlags.DEFAULT)
 		else :
 			output_format.set_active(3)
 			tab_length.set_value(4)
@@ -323,6 +397,9 @@ class PreferencesDialog (Gtk.Dialog) :
 			enable_attributes.set_active(True)
 			smart_emphasis.set_active(True)
 			lazy_ol.set_active(True)
+			highlight_style.set_text("default")
+			reload_delay.set_value(100)
+			change_detection.set_active_id('auto')
 
 	def _combo (self, keys, values) :
 		combo = Gtk.ComboBoxText()
@@ -331,8 +408,14 @@ class PreferencesDialog (Gtk.Dialog) :
 
 	def on_html_replacement_text_changed (self, entry) : self.on_preference_changed('html_replacement_text', entry.get_text())
 
+	def on_highlight_style_changed (self, entry) : self.on_preference_changed('highlight_style', entry.get_text())
+
 	def on_tab_length_changed (self, spin_button) : self.on_preference_changed('tab_length', spin_button.get_value_as_int())
 
+	def on_reload_delay_changed (self, spin_button) : self.reload_delay = spin_button.get_value_as_int()
+
+	def on_change_detection_changed (self, combo) : self.change_detection = combo.get_active_id()
+
 	def on_state_changed (self, widget, key) : self.on_preference_changed(key, widget.get_active())
 
 	def on_preference_changed (self, key, value) :
@@ -345,8 +428,8 @@ class PreferencesDialog (Gtk.Dialog) :
 
 class ErrorDialog (Gtk.MessageDialog) :
 
-	def __init__ (self, error_msg, parent = None) :
-		Gtk.MessageDialog.__init__(self, parent, Gtk.DialogFlags.DESTROY_WITH_PARENT, Gtk.MessageType.ERROR, Gtk.ButtonsType.OK, error_msg, title = __appname__)
+	def __init__ (self, error_msg, parent = None, message_type = Gtk.MessageType.ERROR) :
+		Gtk.MessageDialog.__init__(self, parent, Gtk.DialogFlags.DESTROY_WITH_PARENT, message_type, Gtk.ButtonsType.OK, error_msg, title = __appname__)
 		self.connect('response', self.destroy)
 
 	def destroy (self, *args) : Gtk.MessageDialog.destroy(self)
@@ -360,6 +443,17 @@ class FileChooserDialog (Gtk.FileChooserDialog) :
 		if file : self.set_filename(file)
 		else : self.set_current_folder(os.getcwd())
 
+	def add_check_button (self, label, active = False) :
+		check_button = Gtk.CheckButton.new_with_mnemonic(label)
+		check_button.set_active(active)
+		box = self.get_extra_widget()
+		if not box :
+			box = Gtk.HBox(spacing = 12)
+			self.set_extra_widget(box)
+		box.pack_start(check_button, False, False, False)
+		box.show_all()
+		return check_button
+
 	def add_text_filter (self) :
 		filter = Gtk.FileFilter()
 		filter.set_name(_("Text files"))
@@ -374,44 +468,291 @@ class FileChooserDialog (Gtk.FileChooserDialog) :
 
 
 
-class MdView (Gtk.Window) :
+class QuickSwitcher (Gtk.Dialog) :
+
+	def __init__ (self, parent, title, find) :
+		Gtk.Dialog.__init__(self, title, parent, 0, (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL, Gtk.STOCK_OPEN, Gtk.ResponseType.OK))
+		self.set_default_size(500, 400)
+		self.set_default_response(Gtk.ResponseType.OK)
+		self.find = find
+
+		self.entry = Gtk.Entry()
+		self.entry.set_activates_default(True)
+		self.entry.connect('changed', self.on_entry_changed)
+		self.entry.connect('key-press-event', self.on_entry_key_press_event)
+		self.store = Gtk.ListStore(str, str, object)
+		self.view = Gtk.TreeView(self.store)
+		self.view.set_headers_visible(False)
+		self.view.append_column(Gtk.TreeViewColumn(None, Gtk.CellRendererText(), text = 0))
+		self.view.append_column(Gtk.TreeViewColumn(None, Gtk.CellRendererText(), text = 1))
+		self.view.connect('row-activated', self.on_row_activated)
+
+		scroller = Gtk.ScrolledWindow()
+		scroller.add(self.view)
+		box = self.get_content_area()
+		box.pack_start(self.entry, False, False, 3)
+		box.pack_start(scroller, True, True, 3)
+		box.show_all()
+
+	def reset (self) :
+		self.entry.set_text('')
+		self.update()
+
+	def update (self) :
+		self.store.clear()
+		for primary, secondary, value in self.find(self.entry.get_text()) : self.store.append([primary, secondary, value])
+		if len(self.store) : self.view.set_cursor(Gtk.TreePath(0), None, False)
+
+	def get_query (self) : return self.entry.get_text()
+
+	def get_value (self) :
+		model, iter = self.view.get_selection().get_selected()
+		if iter : return model[iter][2]
+
+	def on_entry_changed (self, entry) : self.update()
+
+	def on_entry_key_press_event (self, entry, event) :
+		if event.keyval in (Gdk.KEY_Up, Gdk.KEY_Down) :
+			path, column = self.view.get_cursor()
+			if path and len(self.store) :
+				row = path.get_indices()[0] + (1 if event.keyval == Gdk.KEY_Down else -1)
+				self.view.set_cursor(Gtk.TreePath(max(0, min(row, len(self.store) - 1))), None, False)
+			return True
+
+	def on_row_activated (self, view, path, column) : self.response(Gtk.ResponseType.OK)
+
+
+
+class StartupTiming (object) :
+
+	def __init__ (self, started) :
+		self.started = self.last = started
+		self.phases = []
+
+	def mark (self, phase) :
+		now = time.time()
+		self.phases.append((phase, now - self.last))
+		self.last = now
+
+	def report (self, out = sys.stderr) :
+		for phase, seconds in self.phases : out.write("{0}: {1:.1f} ms\n".format(phase, seconds * 1000))
+		out.write("{0}: {1:.1f} ms\n".format(_("total"), (self.last - self.started) * 1000))
 
-	USER_HOME = os.path.expanduser('~')
 
-	_menu_batch = False
 
+class Application (Gtk.Application) :
+
+	ID = "apps.mdview-py"
+	RECENT_LOW_MEMORY = 4
+	RECENT_LOW_MEMORY_LIMIT = 8 * 1024 * 1024
+	TRIM_INTERVAL = 60
+
+	low_memory = False
+
+	def __init__ (self) :
+		Gtk.Application.__init__(self, application_id = self.ID, flags = Gio.ApplicationFlags.HANDLES_OPEN)
+		self.engines = EnginePool()
+		self.recent = RecentRenders()
+		self.assets = AssetCache()
+		self.streams = []
+		self._indexed = set()
+		self.render_lock = threading.Lock()
+		self.timing = None
+		self.timings = Timings()
+		self._warmed = set()
+
+	def do_startup (self) :
+		Gtk.Application.do_startup(self)
+		gsettings = settings()
+		self.cache = RenderCache()
+		self.search = SearchIndex()
+		self.prewarm_engines = gsettings.get_boolean("prewarm-engines") if gsettings else True
+		if self.low_memory or gsettings and gsettings.get_boolean("low-memory") : self.limit_memory()
+		self.mark_startup("startup")
+
+	def do_shutdown (self) :
+		self.cache.flush()
+		self.search.save()
+		default_highlighter().close()
+		Gtk.Application.do_shutdown(self)
+
+	def limit_memory (self) :
+		self.low_memory = True
+		self.prewarm_engines = False
+		self.recent.size = self.RECENT_LOW_MEMORY
+		self.recent.limit = self.RECENT_LOW_MEMORY_LIMIT
+		WebKit.set_cache_model(WebKit.CacheModel.DOCUMENT_VIEWER)
+		try : WebKit.application_cache_set_maximum_size(0)
+		except AttributeError : pass
+		GLib.timeout_add_seconds(self.TRIM_INTERVAL, self.on_trim, priority = GLib.PRIORITY_LOW)
+
+	def memory_status (self) :
+		mib = 1024.0 * 1024
+		return _("RSS {0:.1f} MiB  cache {1:.1f} MiB").format(memory_usage() / mib, (self.cache.total() + self.assets.total()) / mib)
+
+	def on_trim (self) :
+		self.recent.clear()
+		self.assets.clear()
+		trim_memory()
+		self.timings.emit({'phase': 'memory', 'rss': memory_usage(), 'cache': self.cache.total()})
+		return True
+
+	def do_activate (self) :
+		self.open_streams()
+		windows = self.get_windows()
+		if windows : windows[0].present()
+		else :
+			MdView(self).show_all()
+			self.mark_startup("window")
+			self.mark_startup(None)
+
+	def do_open (self, files, n_files, hint) :
+		self.open_streams()
+		self.open_windows(*[file.get_path() for file in files if file.get_path()])
+
+	def mark_startup (self, phase) :
+		if self.timing :
+			if phase : self.timing.mark(phase)
+			else :
+				self.timing.report()
+				self.timing = None
+
+	def markdown (self, options) : return self.engines.get(options)
+
+	def prewarm (self, options) :
+		key = options_key(options)
+		if self.prewarm_engines and key not in self._warmed :
+			self._warmed.add(key)
+			thread = threading.Thread(target = self.engines.warm, args = (list(option_variants(options)),))
+			thread.daemon = True
+			thread.start()
+
+	def index_directory (self, directory, limit = None) :
+		if directory not in self._indexed :
+			self._indexed.add(directory)
+			try : names = os.listdir(directory)
+			except OSError : return
+			self.index_files([os.path.join(directory, name) for name in sorted(names) if name.endswith('.md')], limit)
+
+	def index_files (self, files, limit = None) :
+		thread = threading.Thread(target = self._index_files, args = (files, limit))
+		thread.daemon = True
+		thread.start()
+
+	def _index_files (self, files, limit) :
+		for file in files :
+			try : self.search.index_file(file, limit)
+			except (IOError, OSError) : self.search.remove(file)
+			except : pass
+		if len(files) > 1 : self.search.save()
+
+	def open_streams (self, *paths) :
+		self.streams.extend(paths)
+		while self.streams :
+			window = MdView(self)
+			window.show_all()
+			window.open_stream(self.streams.pop(0))
+
+	def open_windows (self, *files) :
+		for file in map(os.path.abspath, files) :
+			for window in self.get_windows() :
+				if isinstance(window, MdView) and window.file in (None, file) : break
+			else :
+				window = MdView(self)
+				window.show_all()
+				self.mark_startup("window")
+			window.load_files(file)
+			window.present()
+
+
+
+class MdView (Gtk.ApplicationWindow) :
+
+	USER_HOME = os.path.expanduser('~')
+	PROGRESSIVE_BLOCKS = 100
+	PREFETCH_FILES = 8
+	PREFETCH_SIZE = 1024 * 1024
+
+	_append_source = None
+	_export_sequence = 0
+	_export_written = 0
+	_generation = 0
+	_hovering = False
+	_jump = None
+	_menu_batch = False
+	_prefetch_source = None
+	_queue = None
+	_queue_final = False
+	_rendered = None
+	_scroll_target = None
+	_source_dirty = True
+
+	_stream_queue = None
+	_stream_splitter = None
+	_stream_text = ()
+
+	about = None
+	export_inline = False
+	export_target = None
 	file = None
+	finder = None
 	html = None
-	monitor = None
-
-	def __init__ (self, *files) :
-		Gtk.Window.__init__(self, title = __appname__)
-		self.connect('delete-event', Gtk.main_quit)
+	keys = ()
+	fragments = None
+	preferences = None
+	profiler = None
+	show_timings = False
+	view_source = False
+	shown = None
+	source_view = None
+	stream = None
+	switcher = None
+	watcher = None
+	workspace = None
+
+	def __init__ (self, application, *files) :
+		Gtk.ApplicationWindow.__init__(self, application = application, title = __appname__)
 		self.set_default_size(600, 500)
 		self.set_default_icon_name(__appname__)
 
+		self.cache = application.cache
+		self._markdown = application.markdown
+		self._recent = application.recent
+		self.low_memory = application.low_memory
+		self.search = application.search
+		self._render_lock = application.render_lock
+		self.timings = application.timings
+		self._export_lock = threading.Lock()
+		self.connect('destroy', self.on_destroy)
 		self._setup_gui()
 
-		self.webview.connect('document-load-finished', self.uri_label.hide)
+		self.webview.connect('document-load-finished', self.on_document_load_finished)
 		self.webview.connect('drag-data-received', self.on_drag_data_received)
 		self.webview.connect('hovering-over-link', self.on_hovering_over_link)
+		self.webview.connect('navigation-policy-decision-requested', self.on_navigation_policy_decision_requested)
 		self.webview.connect("scroll-event", self.on_scroll_event)
 		self.webview.connect('selection-changed', self.on_selection_changed)
 
 		self.menu.connect('FileOpen', self.on_action_open)
+		self.menu.connect('FileOpenFolder', self.on_action_open_folder)
+		self.menu.connect('FileGoTo', self.on_action_go_to_file)
 		self.menu.connect('FileExportHTML', self.on_action_export)
 		self.menu.connect('FileRevertToSaved', self.on_action_revert_to_saved)
-		self.menu.connect('FileQuit', Gtk.main_quit)
+		self.menu.connect('FileQuit', self.on_action_quit)
 		self.menu.connect('EditCopy', self.webview.copy_clipboard)
 		self.menu.connect('EditSelectAll', self.webview.select_all)
-		self.menu.connect('EditPreferences', self.preferences.present)
+		self.menu.connect('EditFind', self.on_action_find)
+		self.menu.connect('EditPreferences', self.on_action_preferences)
 		self.menu.connect('ViewZoomIn', self.webview.zoom_in)
 		self.menu.connect('ViewZoomOut', self.webview.zoom_out)
 		self.menu.connect('ViewZoom100', self.zoom_100)
 		self.menu.connect('ViewViewSource', self.on_action_view_source)
+		self.menu.connect('ViewTimings', self.on_action_timings)
+		self.menu.connect('ViewProfile', self.on_action_profile)
 		self.menu.connect('MarkdownEnableAttributes', self.on_activate_markdown_option, 'enable_attributes')
 		self.menu.connect('MarkdownSmartEmphasis', self.on_activate_markdown_option, 'smart_emphasis')
 		self.menu.connect('MarkdownLazyOl', self.on_activate_markdown_option, 'lazy_ol')
+		self.menu.connect('MarkdownHighlight', self.on_activate_markdown_option, 'highlight')
 		self.menu.connect('MarkdownOutputFormatHTML5', self.on_activate_markdown_option, 'output_format')
 		self.menu.connect('MarkdownOutputFormatHTML4', self.on_activate_markdown_option, 'output_format')
 		self.menu.connect('MarkdownOutputFormatXHTML1', self.on_activate_markdown_option, 'output_format')
@@ -420,12 +761,17 @@ class MdView (Gtk.Window) :
 		self.menu.connect('MarkdownSafeModeReplace', self.on_activate_markdown_option, 'safe_mode')
 		self.menu.connect('MarkdownSafeModeRemove', self.on_activate_markdown_option, 'safe_mode')
 		self.menu.connect('MarkdownSafeModeEscape', self.on_activate_markdown_option, 'safe_mode')
-		self.menu.connect('HelpAbout', self.about.present)
-
-		self.preferences.connect('response', self.on_preferences_changed)
-
+		self.menu.connect('HelpAbout', self.on_action_about)
+
+		gsettings = settings()
+		self.reload_delay = gsettings.get_int("reload-delay") if gsettings else 100
+		self.change_detection = gsettings.get_string("change-detection") if gsettings else 'auto'
+		self.max_file_size = (gsettings.get_int("max-file-size") if gsettings else 256) * 1024 * 1024
+		self.menu.set_show_timings(gsettings.get_boolean("show-timings") if gsettings else False)
+		self.export_inline = gsettings.get_boolean("export-inline") if gsettings else False
 		self.md_options = MarkdownOptions()
-		self._setup_markdown_menu(self.preferences.md_options.dict())
+		self.preferences_options = settings_options()
+		self._setup_markdown_menu(self.preferences_options.dict())
 
 		self.load_files(*files)
 
@@ -433,17 +779,19 @@ class MdView (Gtk.Window) :
 	def _setup_gui (self) :
 		self.menu = Menu()
 		self.webview = WebView()
+		if self.low_memory : self.webview.limit_memory()
 		self.uri_label = UriLabel()
 
 		self.add_accel_group(self.menu.accel_group)
 
-		self.preferences = PreferencesDialog(self)
-		self.about = AboutDialog(self)
-
 		scroller = Gtk.ScrolledWindow()
 		scroller.add(self.webview)
+		self.views = Gtk.Notebook()
+		self.views.set_show_tabs(False)
+		self.views.set_show_border(False)
+		self.views.append_page(scroller, None)
 		overlay = Gtk.Overlay()
-		overlay.add(scroller)
+		overlay.add(self.views)
 		overlay.add_overlay(self.uri_label)
 		box = Gtk.VBox()
 		box.pack_start(self.menu.menubar, False, False, False)
@@ -451,6 +799,7 @@ class MdView (Gtk.Window) :
 		self.add(box)
 
 		self.adj = scroller.get_vadjustment()
+		self.adj.connect('changed', self.on_adjustment_changed)
 		self.adj.connect('value-changed', self.on_adjustment_value_changed)
 
 	def _setup_markdown_menu (self, md_options) :
@@ -458,21 +807,109 @@ class MdView (Gtk.Window) :
 		self.menu.set_enable_attributes(md_options['enable_attributes'])
 		self.menu.set_smart_emphasis(md_options['smart_emphasis'])
 		self.menu.set_lazy_ol(md_options['lazy_ol'])
+		self.menu.set_highlight(md_options.get('highlight'))
 		self.menu.set_output_format(md_options['output_format'])
 		self.menu.set_safe_mode(md_options['safe_mode'])
 		del self._menu_batch
 		self._setup_markdown()
 
-	def _setup_markdown (self) : self.md = Markdown(**self.md_options.dict(self.preferences.md_options.dict()))
+	def _setup_markdown (self) :
+		options = self.md_options.dict(self.preferences_options.dict())
+		self.renderer = BlockRenderer(None, options)
+		self.shown = None
 
 	def _setup_monitor (self) :
-		if self.monitor : self.monitor.cancel()
-		self.monitor = Gio.File.new_for_path(self.file).monitor_file(Gio.FileMonitorFlags.SEND_MOVED | Gio.FileMonitorFlags.WATCH_HARD_LINKS, None)
-		self.monitor.connect('changed', self.on_file_changed)
+		if self.watcher :
+			if self.watcher.file == self.file : return
+			self.watcher.cancel()
+		self.watcher = FileWatcher(self.file, self.on_file_changed, self.reload_delay, self.timings, self.change_detection)
+
+	def _export_bindings (self) :
+		gsettings = settings()
+		return gsettings.get_value("export-bindings").unpack() if gsettings else {}
+
+	def _bind_export (self, target) :
+		self.export_target = target
+		gsettings = settings()
+		if gsettings :
+			bindings = gsettings.get_value("export-bindings").unpack()
+			if target : bindings[self.file] = target
+			else : bindings.pop(self.file, None)
+			gsettings.set_value("export-bindings", GLib.Variant('a{ss}', bindings))
+
+	def _export_bound (self, sequence, file, target, html, assets) :
+		with self._export_lock :
+			if sequence < self._export_written : return
+			self._export_written = sequence
+			try :
+				if assets : html = assets.inline(html, os.path.dirname(file))
+				write_atomic(target, html.encode('utf-8'))
+			except : GLib.idle_add(self._on_export_failed, file, target)
+
+	def _on_export_failed (self, file, target) :
+		if file == self.file and target == self.export_target : self._bind_export(None)
+		self._show_error_dialog(_("Failed writing file {0}").format(target))
+
+	def _html (self) :
+		if self.html is None and self.keys : return '\n'.join(self.fragments[key] for key in self.keys)
+		return self.html
 
 	def _load_html (self, lock_scrolling = False) :
-		if lock_scrolling == True : self._lock_scrolling()
-		self.webview.load_string(self.html, "text/html", "utf-8", "file://" + self.file)
+		if self.html is None and not self.keys : return
+		with self.timings.measure('load_html', file = self.file) :
+			if lock_scrolling == True : self._lock_scrolling()
+			self._queue = [] if self.stream else None
+			if not self.keys :
+				self.shown, html = None, self.html
+			else :
+				self.shown = self.keys
+				html = ''.join('<div>' + self.fragments[key] + '</div>' for key in self.shown)
+			self.timings.start('layout', self)
+			self.webview.load_string(html, "text/html", "utf-8", "file://" + self.file)
+
+	def _patch_html (self) :
+		old, new = self.shown, self.keys
+		if not old or not new : return False
+		if self.webview.get_load_status() != WebKit.LoadStatus.FINISHED : return False
+		start, end, size = 0, 0, min(len(old), len(new))
+		while start < size and old[start] == new[start] : start += 1
+		while end < size - start and old[-1 - end] == new[-1 - end] : end += 1
+		if 2 * (len(new) - start - end) > len(new) : return False
+		fragments = [self.fragments[key] for key in new[start:len(new) - end]]
+		try :
+			with self.timings.measure('patch', file = self.file, blocks = len(fragments)) : patched = self.webview.replace_blocks(start, len(old) - end, len(old), fragments)
+		except : patched = False
+		self.shown = new if patched else None
+		return patched
+
+	def _prefetch (self, generation) :
+		self._prefetch_source = None
+		if generation != self._generation or self.stream or not self.file : return False
+		directory = os.path.dirname(self.file)
+		files = markdown_links(self._html() or '', directory)
+		try : files += [file for file in sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.md')) if file not in files]
+		except OSError : pass
+		files = [file for file in files if file != self.file][:min(self.PREFETCH_FILES, self._recent.size // 2)]
+		thread = threading.Thread(target = self._prefetch_files, args = (generation, files, self.renderer.options))
+		thread.daemon = True
+		thread.start()
+		return False
+
+	def _prefetch_files (self, generation, files, options) :
+		cancelled = lambda : generation != self._generation
+		md = None
+		for file in files :
+			if cancelled() : return
+			try :
+				with TextFile(file, min(self.max_file_size, self.PREFETCH_SIZE)) as source :
+					digest = source.digest()
+					if self._recent.get(file, options_key(options), digest) is not None : continue
+					if md is None : md = create_markdown(options)
+					renderer = BlockRenderer(md, options)
+					html = self._convert(renderer, source, digest, cancelled, file = file)
+				if html is None : return
+				self._recent.set(file, options_key(options), digest, (None if self.low_memory and renderer.keys else html, renderer.keys, renderer.fragments, (file, renderer, digest)))
+			except : pass
 
 	def _lock_scrolling (self) :
 		try :
@@ -482,12 +919,179 @@ class MdView (Gtk.Window) :
 				else : self.adj_value = adj_value
 		except : pass
 
-	def _show_error_dialog (self, msg) :
-		ErrorDialog(msg, self).run()
+	def _render (self, generation, file, renderer, lock_scrolling, progressive) :
+		source = None
+		try :
+			with self._render_lock :
+				if generation != self._generation : return
+				try :
+					started = self.timings.clock()
+					source = TextFile(file, self.max_file_size)
+					rendered = file, renderer, source.digest()
+					if rendered == self._rendered : return
+					self.timings.add('read', self.timings.clock() - started, file = file, size = source.size)
+					options = options_key(renderer.options)
+					result = self._recent.get(file, options, rendered[2]) if self.profiler is None else None
+					if result is not None :
+						renderer.keys, renderer.fragments = result[1], result[2]
+						result = result[:3] + (rendered,)
+					else :
+						started = self.timings.clock()
+						progress = self._progress(generation, lock_scrolling) if progressive else None
+						html = self._convert(renderer, source, rendered[2], lambda : generation != self._generation, progress, self.profiler, file)
+						if html is None : return
+						self.timings.add('convert', self.timings.clock() - started, file = file, blocks = len(renderer.keys))
+						result = None if self.low_memory and renderer.keys else html, renderer.keys, renderer.fragments, rendered
+						self._recent.set(file, options, rendered[2], result)
+				except FileTooLarge as e : result = e
+				except : result = None
+			GLib.idle_add(self._on_rendered, generation, file, lock_scrolling, progressive, result)
+			if isinstance(result, tuple) :
+				try : self.search.index_file(file, self.max_file_size, source, rendered[2])
+				except : pass
+		finally :
+			if source : source.close()
+
+	def _convert (self, renderer, source, digest, cancelled = None, progress = None, profiler = None, file = None) :
+		key = self.cache.key(digest, renderer.options)
+		blocks = self.cache.get(key) if profiler is None else None
+		if blocks is not None : return renderer.restore(blocks)
+		if renderer.md is None : renderer.md = profiler.wrap(create_markdown(renderer.options)) if profiler else self._markdown(renderer.options)
+		if profiler : profiler.reset()
+		html = renderer.convert(source.decode(), cancelled, progress)
+		if html is not None :
+			thread = threading.Thread(target = self.cache.set, args = (key, renderer.dump(), file))
+			thread.daemon = True
+			thread.start()
+		return html
+
+	def _progress (self, generation, lock_scrolling) :
+		blocks = []
+		def progress (key, html) :
+			blocks.append((key, html))
+			if len(blocks) == self.PROGRESSIVE_BLOCKS :
+				GLib.idle_add(self._on_blocks, generation, lock_scrolling, blocks[:])
+				del blocks[:]
+		return progress
+
+	def _append_blocks (self) :
+		if self._queue and not self._append_source and self.webview.get_load_status() == WebKit.LoadStatus.FINISHED :
+			self._append_source = GLib.idle_add(self.on_append_idle)
+
+	def _on_blocks (self, generation, lock_scrolling, blocks) :
+		if generation != self._generation : return
+		if self._queue is None :
+			if lock_scrolling == True : self._lock_scrolling()
+			self._queue, self._queue_final = [], False
+			self.shown = [key for key, html in blocks]
+			self.timings.start('layout', self)
+			self.webview.load_string(''.join('<div>' + html + '</div>' for key, html in blocks), "text/html", "utf-8", "file://" + self.file)
+		else :
+			self._queue.extend(blocks)
+			self._append_blocks()
+
+	def _on_rendered (self, generation, file, lock_scrolling, progressive, result) :
+		if generation == self._generation :
+			if isinstance(result, FileTooLarge) :
+				self.uri_label.hide()
+				self._show_error_dialog(str(result), Gtk.MessageType.WARNING)
+			elif result :
+				self.timings.stop('reload', self, file = file)
+				self.html, self.keys, self.fragments, self._rendered = result
+				self._source_dirty = True
+				if self.view_source : self._update_source_view()
+				if progressive and self._queue is None and len(self.keys) > self.PROGRESSIVE_BLOCKS :
+					self._on_blocks(generation, lock_scrolling, [(key, self.fragments[key]) for key in self.keys[:self.PROGRESSIVE_BLOCKS]])
+				if self._queue is not None :
+					self._queue.extend((key, self.fragments[key]) for key in self.keys[len(self.shown) + len(self._queue):])
+					self._queue_final = True
+					self._append_blocks()
+				elif not self._patch_html() : self._load_html(lock_scrolling)
+				self.get_application().mark_startup("render")
+				self.get_application().prewarm(self.renderer.options)
+				self.get_application().index_directory(os.path.dirname(file), self.max_file_size)
+				self._show_status()
+				if not self._prefetch_source : self._prefetch_source = GLib.idle_add(self._prefetch, generation, priority = GLib.PRIORITY_LOW)
+				if self.export_target :
+					self._export_sequence += 1
+					thread = threading.Thread(target = self._export_bound, args = (self._export_sequence, file, self.export_target, self._html(), self.get_application().assets if self.export_inline else None))
+					thread.daemon = True
+					thread.start()
+			else :
+				self.uri_label.hide()
+				self._show_error_dialog(_("Failed loading file {0}").format(file))
+
+	def _find_files (self, query) :
+		if self.workspace :
+			for path, name, title in self.workspace.find(query) : yield title, name, path
+
+	def _find_text (self, query) :
+		for path, block, count, heading, text in self.search.search(query, first = self.file) :
+			name = os.path.basename(path)
+			yield (name + " › " + heading if heading else name), text, (path, block, count, heading)
+
+	def jump_to (self, file, block, count, heading, query) :
+		self._jump = block, count, heading, query
+		if file == self.file : self._apply_jump()
+		else : self.load(file)
+
+	def _apply_jump (self) :
+		if not self._jump or self.webview.get_load_status() != WebKit.LoadStatus.FINISHED : return
+		block, count, heading, query = self._jump
+		try :
+			document, element = self.webview.get_dom_document(), None
+			if self.shown is not None and len(self.keys) == count :
+				if block >= len(self.shown) : return
+				element = document.get_body().get_children().item(block)
+			elif heading :
+				for level in range(1, 7) :
+					nodes = document.get_elements_by_tag_name('h{0}'.format(level))
+					element = next((nodes.item(i) for i in range(nodes.get_length()) if nodes.item(i).get_text_content().strip() == heading), None)
+					if element : break
+			if element : element.scroll_into_view(True)
+			self.webview.unmark_text_matches()
+			for word in query.split() : self.webview.mark_text_matches(word, False, 0)
+			self.webview.set_highlight_text_matches(True)
+		except : pass
+		self._jump = None
+
+	def _update_source_view (self) :
+		if not self.source_view :
+			self.source_view = SourceView()
+			self.source_view.show_all()
+			self.views.append_page(self.source_view, None)
+		if self._source_dirty and (self.html is not None or self.keys) :
+			try :
+				if self.stream : markdown = '\n\n'.join(self._stream_text)
+				else :
+					with TextFile(self.file, self.max_file_size) as source : markdown = source.decode()
+			except : markdown = ''
+			self.source_view.set_source(markdown, self._html())
+			self._source_dirty = False
+
+	def _show_status (self) :
+		if self._hovering : return
+		status = self.timings.summary() if self.show_timings else None
+		if self.show_timings and self.low_memory : status = "  ".join(filter(None, (status, self.get_application().memory_status())))
+		if self.profiler and self.profiler.stats : status = "  ".join(filter(None, (status, self.profiler.summary())))
+		if status :
+			self.uri_label.set_text(status)
+			self.uri_label.show()
+		else : self.uri_label.hide()
+
+	def _show_error_dialog (self, msg, message_type = Gtk.MessageType.ERROR) :
+		ErrorDialog(msg, self, message_type).run()
 
 	def load_files (self, *files) :
 		if files :
 			files = list(map(os.path.abspath, files))
+			for file in [file for file in files if os.path.isdir(file)] :
+				files.remove(file)
+				self.open_workspace(file)
+			for file in [file for file in files if is_stream(file)] :
+				files.remove(file)
+				if self.file : self.get_application().open_streams(file)
+				else : self.open_stream(file)
 			if self.file in files :
 				self.menu.set_view_source(False)
 				self.zoom_100()
@@ -496,63 +1100,204 @@ class MdView (Gtk.Window) :
 			else :
 				while files :
 					if self.load(files.pop(0)) : break
-			if files :
-				files.insert(0, __file__)
-				if sys.executable : files.insert(0, sys.executable)
-				Popen(files)
+			if files : self.get_application().open_windows(*files)
 
 	def load (self, file, lock_scrolling = False) :
-		old_file, self.file = self.file, os.path.abspath(file)
-		old_html, self.html = self.html, None
-		if self.reload(lock_scrolling) :
-			self._setup_monitor()
-			self.zoom_100()
-			self.menu.set_document_available(True)
-			self.menu.set_view_source(False)
-			self.set_title("{2} ({1}) - {0}".format(__appname__, *os.path.split(self.file.replace(self.USER_HOME, '~', 1))))
-			return old_file or True
-		self.file = old_file
-		self.html = old_html
+		file = os.path.abspath(file)
+		try : TextFile.check(file, self.max_file_size)
+		except FileTooLarge as e :
+			self._show_error_dialog(str(e), Gtk.MessageType.WARNING)
+			return
+		except :
+			self._show_error_dialog(_("Failed loading file {0}").format(file))
+			return
+		self._close_stream()
+		old_file, self.file = self.file, file
+		self.shown = None
+		self.export_target = self._export_bindings().get(file)
+		if self.html is None and not self.keys :
+			self.uri_label.set_text(_("Loading {0}…").format(os.path.basename(file)))
+			self.uri_label.show()
+		self.reload(lock_scrolling)
+		self._setup_monitor()
+		self.zoom_100()
+		self.menu.set_document_available(True)
+		self.menu.set_view_source(False)
+		self.set_title("{2} ({1}) - {0}".format(__appname__, *os.path.split(self.file.replace(self.USER_HOME, '~', 1))))
+		return old_file or True
+
+	def open_stream (self, path) :
+		self._close_stream()
+		if self.watcher : self.watcher.cancel()
+		self.watcher = None
+		self.file = os.path.join(os.getcwd(), '-') if path == '-' else os.path.abspath(path)
+		self.html, self.keys, self.fragments, self.shown, self._rendered = None, [], {}, None, None
+		self.export_target = None
+		self._generation += 1
+		self._queue = None
+		self._scroll_target = False
+		self._source_dirty = True
+		self._stream_splitter, self._stream_text = BlockSplitter(), []
+		self._stream_queue = queue.Queue()
+		thread = threading.Thread(target = self._convert_stream, args = (self._stream_queue, self._generation, self.renderer))
+		thread.daemon = True
+		thread.start()
+		try : self.stream = StreamReader(path, self.on_stream_received, self.on_stream_closed)
+		except :
+			self._close_stream()
+			self._show_error_dialog(_("Failed loading file {0}").format(self.file))
+			return
+		self.uri_label.set_text(_("Loading {0}…").format(os.path.basename(self.file)))
+		self.uri_label.show()
+		self.menu.set_document_available(True)
+		self.menu.set_view_source(False)
+		self.set_title("{2} ({1}) - {0}".format(__appname__, *os.path.split(self.file.replace(self.USER_HOME, '~', 1))))
+
+	def _close_stream (self) :
+		if self.stream : self.stream.close()
+		if self._stream_queue : self._stream_queue.put(None)
+		self.stream = self._stream_queue = None
+
+	def _convert_stream (self, texts, generation, renderer) :
+		while True :
+			text = texts.get()
+			if text is None or generation != self._generation : return
+			with self._render_lock :
+				if renderer.md is None : renderer.md = self._markdown(renderer.options)
+				blocks = list(renderer.iterconvert(text, append = True))
+			GLib.idle_add(self._on_stream_blocks, generation, text, blocks)
+
+	def _on_stream_blocks (self, generation, text, blocks) :
+		if generation != self._generation : return
+		self._stream_text.append(text)
+		self.keys = self.keys + [key for key, html in blocks]
+		self.fragments.update(blocks)
+		html = '\n'.join(html for key, html in blocks)
+		if not self.low_memory : self.html = html if self.html is None else self.html + '\n' + html
+		self._source_dirty = True
+		if self.view_source : self._update_source_view()
+		if blocks : self._on_blocks(generation, False, blocks)
+		self._show_status()
+
+	def open_workspace (self, path) :
+		if self.workspace : self.workspace.cancel()
+		self.workspace = Workspace(path, self.max_file_size)
+		self.menu.set_workspace_available(True)
+		thread = threading.Thread(target = self._scan_workspace, args = (self.workspace,))
+		thread.daemon = True
+		thread.start()
+
+	def _scan_workspace (self, workspace) :
+		workspace.scan()
+		GLib.idle_add(self._on_workspace_scanned, workspace)
+
+	def _on_workspace_scanned (self, workspace) :
+		if workspace is self.workspace :
+			workspace.watch(self.on_workspace_changed)
+			self.get_application().index_files(sorted(workspace.files), self.max_file_size)
+			if self.switcher and self.switcher.get_visible() : self.switcher.update()
+			elif not self.file : self.on_action_go_to_file(None)
 
 	def reload (self, lock_scrolling = False) :
-		try :
-			if self.file :
-				with open(self.file, 'r', 'utf-8') as f : self.html = self.md.reset().convert(f.read())
-				self._load_html(lock_scrolling)
-				return True
-		except : self._show_error_dialog(_("Failed loading file {0}").format(self.file))
-
-	def export_html (self, file) :
+		if self.file and not self.stream :
+			if self._queue is not None : self.shown = self._queue = None
+			self._generation += 1
+			self.timings.start('reload', self)
+			thread = threading.Thread(target = self._render, args = (self._generation, self.file, self.renderer, lock_scrolling, self.shown is None))
+			thread.daemon = True
+			thread.start()
+			return True
+
+	def export_html (self, file, inline = False) :
 		try :
 			if file :
-				with open(file, 'w', 'utf-8') as f : f.write(self.html)
+				html = self._html()
+				if html is None :
+					with TextFile(self.file) as source :
+						with self._render_lock : html = self._convert(self.renderer, source, source.digest())
+				if inline : html = self.get_application().assets.inline(html, os.path.dirname(self.file))
+				write_atomic(file, html.encode('utf-8'))
 				return True
 		except : self._show_error_dialog(_("Failed writing file {0}").format(self.file))
 
-	def toggle_view_source (self) : self.menu.set_view_source(not self.webview.get_view_source_mode())
+	def destroy (self, *args) : Gtk.ApplicationWindow.destroy(self)
+
+	def toggle_view_source (self) : self.menu.set_view_source(not self.view_source)
 
 	def zoom_100 (self, *args) : self.webview.set_zoom_level(1)
 
-	def on_file_changed (self, monitor, file, new_file, event) :
-		if event == Gio.FileMonitorEvent.CHANGES_DONE_HINT :
-			self.reload(True)
-		elif event == Gio.FileMonitorEvent.CREATED :
-			self._setup_monitor()
-			self.reload(True)
-		elif event == Gio.FileMonitorEvent.MOVED :
-			self.load(new_file.get_path(), True)
+	def on_destroy (self, window) :
+		self._generation += 1
+		if self.watcher : self.watcher.cancel()
+		if self.workspace : self.workspace.cancel()
+		self._close_stream()
+		if self._append_source : GLib.source_remove(self._append_source)
+		if self._prefetch_source : GLib.source_remove(self._prefetch_source)
+
+	def on_file_changed (self, moved_file) :
+		if moved_file : self.load(moved_file, True)
+		else : self.reload(True)
+
+	def on_stream_received (self, text) :
+		blocks = self._stream_splitter.feed(text)
+		if blocks : self._stream_queue.put('\n\n'.join(blocks))
+
+	def on_stream_closed (self) :
+		blocks = self._stream_splitter.finish()
+		if blocks : self._stream_queue.put('\n\n'.join(blocks))
+		if self.html is None and not self.keys : self.uri_label.hide()
+
+	def on_workspace_changed (self, path) :
+		if path.endswith('.md') : self.get_application().index_files([path], self.max_file_size)
+		if self.switcher and self.switcher.get_visible() : self.switcher.update()
+
+	def on_append_idle (self) :
+		if self._queue and self.webview.get_load_status() == WebKit.LoadStatus.FINISHED :
+			blocks = self._queue[:self.PROGRESSIVE_BLOCKS]
+			del self._queue[:self.PROGRESSIVE_BLOCKS]
+			count = len(self.shown)
+			try : appended = self.webview.replace_blocks(count, count, count, [html for key, html in blocks])
+			except : appended = False
+			if appended :
+				self.shown = self.shown + [key for key, html in blocks]
+				self._apply_jump()
+				if self._queue : return True
+			else :
+				self.shown = self._queue = None
+				if self._queue_final : self._load_html()
+		self._append_source = None
+		if self._queue_final and not self._queue : self._queue = None
+		return False
+
+	def on_document_load_finished (self, webview, frame) :
+		self.timings.stop('layout', self, file = self.file)
+		self.timings.start('scroll', self)
+		self._show_status()
+		self._append_blocks()
+		self._apply_jump()
+		self.get_application().mark_startup("layout")
+		self.get_application().mark_startup(None)
 
 	def on_drag_data_received (self, widget, drag_context, x, y, data, info, time) :
 		self.load_files(*map(lambda uri : unquote(urlparse(uri).path), data.get_uris()))
 
+	def on_navigation_policy_decision_requested (self, webview, frame, request, action, decision) :
+		if action.get_reason() != WebKit.WebNavigationReason.LINK_CLICKED : return False
+		path = local_markdown_path(request.get_uri().split('#', 1)[0], os.path.dirname(self.file or ''))
+		if not path or path == self.file : return False
+		decision.ignore()
+		self.load(path)
+		return True
+
 	def on_hovering_over_link (self, webview, title, uri) :
+		self._hovering = bool(uri)
 		if uri :
 			self.uri_label.set_text(uri)
 			self.uri_label.show()
-		else :
-			self.uri_label.hide()
+		else : self._show_status()
 
 	def on_scroll_event (self, webview, event) :
+		self._scroll_target = None
 		if event.type == Gdk.EventType.SCROLL and event.state == Gdk.ModifierType.CONTROL_MASK :
 			if event.direction == Gdk.ScrollDirection.UP :
 				webview.zoom_in()
@@ -563,17 +1308,36 @@ class MdView (Gtk.Window) :
 
 	def on_selection_changed (self, widget) : self.menu.set_selection_available(widget.has_selection())
 
+	def on_adjustment_changed (self, adj) :
+		if self._scroll_target is not None :
+			bottom = adj.get_upper() - adj.get_page_size()
+			if self._scroll_target is not False and self._scroll_target <= bottom :
+				adj.set_value(self._scroll_target)
+				self._scroll_target = None
+			else :
+				adj.set_value(bottom)
+				if self._queue is None : self._scroll_target = None
+
 	def on_adjustment_value_changed (self, adj) :
+		if self.stream and adj.get_value() and adj.get_value() >= adj.get_upper() - adj.get_page_size() : self._scroll_target = False
 		try :
 			if not adj.get_value() :
 				if adj.get_upper() :
 					if self.adj_value : adj.set_value(self.adj_value)
 					else : adj.set_value(adj.get_upper() - adj.get_page_size())
+					self.timings.stop('scroll', self, file = self.file)
+				if self._queue is not None : self._scroll_target = self.adj_value
 				del self.adj_value
 		except : pass
 
 	def on_preferences_changed (self, preferences, response_id) :
 		preferences.hide()
+		self.reload_delay = preferences.reload_delay
+		self.change_detection = preferences.change_detection
+		if self.watcher :
+			self.watcher.delay = self.reload_delay
+			self.watcher.set_backend(self.change_detection)
+		self.preferences_options = preferences.md_options
 		self._setup_markdown_menu(preferences.md_options.dict())
 		self.reload(True)
 
@@ -587,25 +1351,82 @@ class MdView (Gtk.Window) :
 		dialog.destroy()
 		if ok : self.load_files(*files)
 
+	def on_action_open_folder (self, action) :
+		dialog = FileChooserDialog(_("Open Folder"), self, Gtk.FileChooserAction.SELECT_FOLDER, Gtk.STOCK_OPEN, self.workspace.root if self.workspace else None)
+		ok = dialog.run() == Gtk.ResponseType.OK
+		path = dialog.get_filename()
+		dialog.destroy()
+		if ok : self.open_workspace(path)
+
+	def on_action_go_to_file (self, action) :
+		if not self.switcher :
+			self.switcher = QuickSwitcher(self, _("Go to File"), self._find_files)
+		self.switcher.reset()
+		ok = self.switcher.run() == Gtk.ResponseType.OK
+		file = self.switcher.get_value()
+		self.switcher.hide()
+		if ok and file : self.load_files(file)
+
+	def on_action_find (self, action) :
+		if not self.finder :
+			self.finder = QuickSwitcher(self, _stock(Gtk.STOCK_FIND, False), self._find_text)
+		self.finder.update()
+		ok = self.finder.run() == Gtk.ResponseType.OK
+		hit, query = self.finder.get_value(), self.finder.get_query()
+		self.finder.hide()
+		if ok and hit : self.jump_to(*(hit + (query,)))
+
 	def on_action_export (self, action) :
 		dialog = FileChooserDialog(_stock(Gtk.STOCK_SAVE_AS, False), self, Gtk.FileChooserAction.SAVE, Gtk.STOCK_SAVE, self.file)
 		dialog.set_local_only(True)
 		dialog.set_do_overwrite_confirmation(True)
 		if self.file : dialog.set_current_name(os.path.splitext(os.path.basename(self.file))[0] + ".html")
+		if self.export_target : dialog.set_filename(self.export_target)
 		dialog.add_pattern_filter(_("HTML files"), ["*.html", "*.htm"])
 		dialog.add_text_filter()
+		keep = dialog.add_check_button(_("_Keep up to date"), bool(self.export_target))
+		inline = dialog.add_check_button(_("_Inline images and stylesheets"), self.export_inline)
 		ok = dialog.run() == Gtk.ResponseType.OK
-		file = dialog.get_filename()
+		file, keep, inline = dialog.get_filename(), keep.get_active(), inline.get_active()
 		dialog.destroy()
-		if ok : self.export_html(file)
+		if ok :
+			if inline != self.export_inline :
+				self.export_inline = inline
+				gsettings = settings()
+				if gsettings : gsettings.set_boolean("export-inline", inline)
+			if self.export_html(file, inline) : self._bind_export(file if keep else None)
+
+	def on_action_about (self, action) :
+		if not self.about :
+			self.about = AboutDialog(self)
+		self.about.present()
+
+	def on_action_preferences (self, action) :
+		if not self.preferences :
+			self.preferences = PreferencesDialog(self)
+			self.preferences.connect('response', self.on_preferences_changed)
+		self.preferences.present()
+
+	def on_action_quit (self, action) : self.get_application().quit()
 
 	def on_action_revert_to_saved (self, action) :
 		self.zoom_100()
-		self._load_html()
+		if self.shown is None or self.shown != self.keys or self._queue or self.webview.get_load_status() != WebKit.LoadStatus.FINISHED : self._load_html()
+
+	def on_action_timings (self, action) :
+		self.show_timings = action.get_active()
+		self._show_status()
+
+	def on_action_profile (self, action) :
+		self.profiler = StageProfiler() if action.get_active() else None
+		self._setup_markdown()
+		self.reload()
+		self._show_status()
 
 	def on_action_view_source (self, action) :
-		self.webview.set_view_source_mode(action.get_active())
-		self._load_html()
+		self.view_source = action.get_active()
+		if self.view_source : self._update_source_view()
+		self.views.set_current_page(1 if self.view_source and self.source_view else 0)
 
 	def on_activate_markdown_option (self, action, key) :
 		try :
@@ -619,11 +1440,30 @@ class MdView (Gtk.Window) :
 
 
 def main () :
-	import signal, gettext
+	import argparse, signal, gettext
 	signal.signal(signal.SIGINT, signal.SIG_DFL)
 	gettext.textdomain(__appname__)
-	MdView(*sys.argv[1:]).show_all()
-	Gtk.main()
+	parser = argparse.ArgumentParser(prog = __appname__)
+	parser.add_argument('--cache-stats', action = 'store_true', help = _("print render cache statistics and exit"))
+	parser.add_argument('--startup-timing', action = 'store_true', help = _("print the time spent in each startup phase"))
+	parser.add_argument('--low-memory', action = 'store_true', help = _("keep memory use flat for long running sessions"))
+	parser.add_argument('--watch-export', nargs = 2, metavar = ('SOURCE', 'TARGET'), help = _("keep TARGET up to date with SOURCE without a GUI"))
+	parser.add_argument('files', nargs = '*')
+	args = parser.parse_args()
+	if args.cache_stats :
+		for key, value in sorted(RenderCache().stats().items()) : print("{0}: {1}".format(key, value))
+		return
+	if args.watch_export :
+		from mdview_core import watch_export_main
+		return watch_export_main(args.watch_export)
+	application = Application()
+	application.low_memory = args.low_memory
+	application.streams = [file for file in args.files if is_stream(file)]
+	if application.streams : application.set_flags(application.get_flags() | Gio.ApplicationFlags.NON_UNIQUE)
+	if args.startup_timing :
+		application.timing = StartupTiming(_started)
+		application.mark_startup("imports")
+	application.run(sys.argv[:1] + [file for file in args.files if file not in application.streams])
 
 if __name__ == '__main__' : main()
 
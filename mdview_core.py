@@ -0,0 +1,2061 @@
+# -*- coding: utf-8 -*-
+#	This file is part of mdview.py
+#
+#	Copyright (c) 2013 Christian Schmitz <tynn.dev@gmail.com>
+#
+#	mdview.py is free software: you can redistribute it and/or modify
+#	it under the terms of the GNU General Public License as published by
+#	the Free Software Foundation, either version 3 of the License, or
+#	(at your option) any later version.
+#
+#	mdview.py is distributed in the hope that it will be useful,
+#	but WITHOUT ANY WARRANTY; without even the implied warranty of
+#	MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#	GNU General Public License for more details.
+#
+#	You should have received a copy of the GNU General Public License
+#	along with mdview.py. If not, see <http://www.gnu.org/licenses/>.
+
+__appname__ = "mdview.py"
+__version__ = "1.0b"
+__author__ = "Christian Schmitz"
+__author_email__ = "tynn.dev@gmail.com"
+__url__ = "https://github.com/tynn/mdview-py"
+
+
+import base64, binascii, bisect, codecs, contextlib, errno, hashlib, json, mimetypes, multiprocessing, os, pickle, re, socket, stat, subprocess, sys, tempfile, threading, time, zlib
+from codecs import open
+from collections import deque, OrderedDict
+from gettext import gettext as _
+try : import queue
+except ImportError : import Queue as queue
+try : from urllib.parse import unquote, urlparse
+except :
+	from urllib import unquote
+	from urlparse import urlparse
+
+
+SCHEMA = "apps.mdview-py"
+
+
+def options_key (options) : return repr(sorted((key, options[key]) for key in options))
+
+
+def option_variants (options) :
+	for key in ('output_format', 'safe_mode') :
+		for value in getattr(MarkdownOptions, key) :
+			if key in options and options[key] != value : yield dict(options, **{key: value})
+
+
+def create_markdown (options) :
+	from markdown import Markdown
+	kwargs = dict((key, value) for key, value in options.items() if key not in ('highlight', 'highlight_style'))
+	if options.get('highlight') : kwargs['extensions'] = ['markdown.extensions.fenced_code']
+	return Markdown(**kwargs)
+
+
+def markdown_version () :
+	import markdown
+	return getattr(markdown, 'version', None) or getattr(markdown, '__version__', '')
+
+
+def cache_path (*names) : return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache')), __appname__, *names)
+
+
+def settings () :
+	try : from gi.repository import Gio
+	except ImportError : return None
+	if SCHEMA in Gio.Settings.list_schemas() : return Gio.Settings.new(SCHEMA)
+
+
+def is_stream (path) :
+	try : return path == '-' or stat.S_ISFIFO(os.stat(path).st_mode)
+	except OSError : return False
+
+
+def _umask () :
+	try :
+		with open('/proc/self/status', 'r') as f :
+			for line in f :
+				if line.startswith('Umask:') : return int(line.split()[1], 8)
+	except (IOError, OSError, ValueError) : pass
+	umask = os.umask(0o022)
+	os.umask(umask)
+	return umask
+
+def copy_mode (fd, path) :
+	try : mode = stat.S_IMODE(os.stat(path).st_mode)
+	except OSError : mode = 0o666 & ~_umask()
+	os.fchmod(fd, mode)
+
+
+def write_atomic (path, data) :
+	try :
+		if os.path.getsize(path) == len(data) :
+			with open(path, 'rb') as f :
+				if f.read() == data : return False
+	except (IOError, OSError) : pass
+	fd, temp = tempfile.mkstemp('.tmp', '.' + os.path.basename(path), os.path.dirname(os.path.abspath(path)))
+	try :
+		copy_mode(fd, path)
+		with os.fdopen(fd, 'wb') as f : f.write(data)
+		os.rename(temp, path)
+	except :
+		os.remove(temp)
+		raise
+	return True
+
+
+def memory_usage () :
+	try :
+		with open('/proc/self/statm', 'r') as f : return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+	except (IOError, OSError, ValueError, IndexError) :
+		import resource
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def trim_memory () :
+	import gc
+	gc.collect()
+	try :
+		import ctypes
+		ctypes.CDLL(None).malloc_trim(0)
+	except (AttributeError, OSError) : pass
+
+
+
+class FileTooLarge (Exception) :
+
+	def __init__ (self, file, size, limit) :
+		Exception.__init__(self, _("File {0} is larger than {1} MiB").format(file, limit // (1024 * 1024)))
+		self.file = file
+		self.size = size
+		self.limit = limit
+
+
+
+class TextFile (object) :
+
+	BOMS = ((codecs.BOM_UTF32_LE, 'utf-32-le'), (codecs.BOM_UTF32_BE, 'utf-32-be'), (codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16-le'), (codecs.BOM_UTF16_BE, 'utf-16-be'))
+	FALLBACK = 'latin-1'
+	PREFIX = 64 * 1024
+
+	encoding = None
+	text = None
+
+	def __init__ (self, file, limit = None) :
+		with open(file, 'rb') as f :
+			self.size = self.check(file, limit, f)
+			self.mtime = os.fstat(f.fileno()).st_mtime
+			self.data, view, read = bytearray(self.size), None, 0
+			if self.size : view = memoryview(self.data)
+			while read < self.size :
+				count = f.readinto(view[read:])
+				if not count : break
+				read += count
+			del view
+			if read < self.size : del self.data[read:]
+			self.size = read
+
+	@staticmethod
+	def check (file, limit = None, f = None) :
+		if f is None :
+			with open(file, 'rb') as f : return TextFile.check(file, limit, f)
+		size = os.fstat(f.fileno()).st_size
+		if limit and size > limit : raise FileTooLarge(file, size, limit)
+		return size
+
+	def __enter__ (self) : return self
+
+	def __exit__ (self, *args) : self.close()
+
+	def close (self) : self.data, self.text = b'', None
+
+	def digest (self) : return hashlib.sha1(self.data).digest()
+
+	def decode (self) :
+		if self.text is None : self.text = self._detect()
+		return self.text
+
+	def _detect (self) :
+		for bom, encoding in self.BOMS :
+			if self.data[:len(bom)] == bom : return self._decode(encoding, len(bom))
+		try : codecs.getincrementaldecoder('utf-8')().decode(self.data[:self.PREFIX], False)
+		except UnicodeDecodeError : return self._decode(self.FALLBACK)
+		try : return self._decode('utf-8')
+		except UnicodeDecodeError : return self._decode(self.FALLBACK)
+
+	def _decode (self, encoding, offset = 0) :
+		try : view = memoryview(self.data)[offset:]
+		except TypeError : view = self.data[offset:]
+		text = codecs.decode(view, encoding)
+		self.encoding = encoding
+		return text
+
+
+
+class MarkdownOptions (object) :
+
+	KEYS = ('output_format', 'safe_mode', 'html_replacement_text', 'tab_length', 'enable_attributes', 'smart_emphasis', 'lazy_ol', 'highlight', 'highlight_style')
+
+	output_format = ('xhtml1', 'xhtml5', 'html4', 'html5')
+	safe_mode = (False, 'replace', 'remove', 'escape')
+	html_replacement_text = str
+	tab_length = int
+	enable_attributes = bool
+	smart_emphasis = bool
+	lazy_ol = bool
+	highlight = bool
+	highlight_style = str
+
+	DEFAULTS = {'output_format': 'html5', 'safe_mode': 'escape', 'html_replacement_text': '', 'tab_length': 4, 'enable_attributes': True, 'smart_emphasis': True, 'lazy_ol': True, 'highlight': False, 'highlight_style': 'default'}
+
+	def set (self, key, value) :
+		if key in MarkdownOptions.KEYS : setattr(self, key, value)
+
+	def set_nick (self, key, value) :
+		attr = getattr(MarkdownOptions, key, None)
+		if tuple == type(attr) :
+			for option in attr :
+				if str(option) == str(value) : value = option
+		self.set(key, value)
+
+	def dict (self, dict = None) :
+		if not dict : dict = {}
+		for key in MarkdownOptions.KEYS :
+			attr = getattr(MarkdownOptions, key)
+			value = getattr(self, key)
+			if bool == attr == type(value) or tuple == type(attr) and value in attr or value and attr == type(value) : dict[key] = value
+		return dict
+
+
+
+class BlockSplitter (object) :
+
+	HEAD = 80
+
+	def __init__ (self) :
+		self.block, self.fences, self.close = None, 0, None
+		self.pending, self.carriage = '', ''
+
+	def add (self, chunk) :
+		block, done = self.block, None
+		if self._continues(chunk) : block.append(chunk)
+		else :
+			if block : done = '\n\n'.join(block)
+			self.block, self.fences, self.close = [chunk], 0, None
+			match = BlockRenderer.HTML.match(chunk)
+			if match :
+				tag = match.group(1).lower()
+				if tag == '!--' : self.close = '-->'
+				elif tag not in BlockRenderer.VOID : self.close = '</' + tag
+		self.fences += len(BlockRenderer.FENCE.findall(chunk))
+		if self.close and self.close in chunk.lower() : self.close = None
+		return done
+
+	def flush (self) :
+		block, self.block, self.fences, self.close = self.block, None, 0, None
+		if block and block[0] : return '\n\n'.join(block)
+
+	def feed (self, text) :
+		text = self.carriage + text
+		self.carriage = '\r' if text.endswith('\r') else ''
+		if self.carriage : text = text[:-1]
+		if '\r' in text : text = text.replace('\r\n', '\n').replace('\r', '\n')
+		pending = self.pending
+		start = len(pending)
+		while start and pending[start - 1] in ' \t\n' : start -= 1
+		pending += text
+		blocks, end = [], 0
+		for match in BlockRenderer.SPLIT.finditer(pending, start) :
+			blocks.extend(self._add(pending[end:match.start()]))
+			end = match.end()
+		self.pending = pending[end:]
+		head = self.pending[:self.HEAD].lstrip('\n')
+		if self.block and ('\n' in head or len(head) > self.HEAD // 2) and not self._continues(head) : blocks.append(self.flush())
+		return blocks
+
+	def finish (self) :
+		text, self.pending, self.carriage = self.pending + self.carriage, '', ''
+		if '\r' in text : text = text.replace('\r\n', '\n').replace('\r', '\n')
+		blocks = [block for chunk in BlockRenderer.SPLIT.split(text.strip('\n')) for block in self._add(chunk)]
+		block = self.flush()
+		if block : blocks.append(block)
+		return blocks
+
+	def _continues (self, chunk) :
+		block = self.block
+		return block and (self.fences % 2 or self.close or BlockRenderer.LIST.match(block[0]) and BlockRenderer.LIST.match(chunk) or block[0][0] == chunk[0] == '>')
+
+	def _add (self, chunk) :
+		chunk = chunk.lstrip('\n')
+		if chunk :
+			block = self.add(chunk)
+			if block : yield block
+
+
+
+class BlockRenderer (object) :
+
+	LOOKAHEAD = 16
+
+	SPLIT = re.compile(r'\n(?:[ \t]*\n)+(?=\S)')
+	FENCE = re.compile(r'^ {0,3}(?:`{3,}|~{3,})', re.M)
+	LIST = re.compile(r' {0,3}(?:[*+-]|\d+\.)[ \t]')
+	HTML = re.compile(r'<(!--|[a-zA-Z][a-zA-Z0-9]*)')
+	REFERENCE = re.compile(r'^ {0,3}\[[^\]]+\]:', re.M)
+	VOID = ('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr')
+
+	def __init__ (self, md, options = None) :
+		self.md = md
+		self.options = options or {}
+		self.keys = []
+		self.fragments = {}
+		self.references = {}
+		self.references_key = None
+		self.references_source = ''
+
+	def split (self, text) :
+		if '\r' in text : text = text.replace('\r\n', '\n').replace('\r', '\n')
+		splitter = BlockSplitter()
+		blocks = [block for block in map(splitter.add, self.SPLIT.split(text.strip('\n'))) if block]
+		block = splitter.flush()
+		if block : blocks.append(block)
+		return blocks
+
+	def convert (self, text, cancelled = None, progress = None) :
+		fragments = []
+		for key, html in self.iterconvert(text, cancelled) :
+			fragments.append(html)
+			if progress : progress(key, html)
+		if not (cancelled and cancelled()) : return '\n'.join(fragments)
+
+	def iterconvert (self, text, cancelled = None, append = False) :
+		if 'footnote' in self.md.treeprocessors :
+			html = self.md.reset().convert(text)
+			key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+			self.keys, self.fragments = [key] if html else [], {key: html}
+			if html : yield key, html
+			return
+		blocks = self.split(text)
+		self._setup_references(blocks, append)
+		highlighter = default_highlighter() if self.options.get('highlight') else None
+		keys, fragments, pending = [], {}, deque()
+		for block in blocks :
+			if cancelled and cancelled() : return
+			key = hashlib.sha1(self.references_key + block.encode('utf-8')).hexdigest()
+			html = fragments.get(key, self.fragments.get(key))
+			if html is None :
+				self.md.reset()
+				self.md.references.update(self.references)
+				html = self.md.convert(block)
+				if highlighter : html = highlighter.submit(html, self.options.get('highlight_style') or 'default')
+			fragments[key] = html
+			pending.append(key)
+			for item in self._flush(pending, fragments, keys, self.LOOKAHEAD) : yield item
+		for item in self._flush(pending, fragments, keys, 0) : yield item
+		self.keys, self.fragments = keys, fragments
+
+	def _flush (self, pending, fragments, keys, limit) :
+		while len(pending) > limit or pending and not hasattr(fragments[pending[0]], 'get') :
+			key = pending.popleft()
+			html = fragments[key]
+			if hasattr(html, 'get') : html = fragments[key] = html.get()
+			if html :
+				keys.append(key)
+				yield key, html
+
+	def dump (self) : return [[key, self.fragments[key]] for key in self.keys]
+
+	def restore (self, blocks) :
+		self.keys = [key for key, html in blocks]
+		self.fragments = dict(blocks)
+		return '\n'.join(html for key, html in blocks)
+
+	def _setup_references (self, blocks, append = False) :
+		source = '\n\n'.join(block for block in blocks if self.REFERENCE.search(block))
+		if append and self.references_source : source = self.references_source + '\n\n' + source if source else self.references_source
+		self.references_source = source
+		key = hashlib.sha1(source.encode('utf-8')).digest()
+		if key != self.references_key :
+			self.md.reset().convert(source)
+			self.references = dict(self.md.references)
+			self.references_key = key
+
+
+
+class EnginePool (object) :
+
+	SIZE = 8
+
+	def __init__ (self, size = SIZE) :
+		self.size = size
+		self.engines = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get (self, options) :
+		key = options_key(options)
+		with self._lock : md = self.engines.pop(key, None)
+		if md is None : md = self._create(options)
+		self._add(key, md)
+		return md.reset()
+
+	def warm (self, variants) :
+		for options in variants :
+			key = options_key(options)
+			if key not in self.engines : self._add(key, self._create(options), False)
+
+	def _add (self, key, md, used = True) :
+		with self._lock :
+			if not used and len(self.engines) >= self.size : return
+			self.engines[key] = md
+			while len(self.engines) > self.size : self.engines.popitem(False)
+
+	def _create (self, options) : return create_markdown(options)
+
+
+
+def _highlight (task) :
+	language, code, style = task
+	try :
+		from pygments import highlight
+		from pygments.formatters import HtmlFormatter
+		from pygments.lexers import get_lexer_by_name
+		from pygments.util import ClassNotFound
+	except ImportError : return ''
+	try : lexer = get_lexer_by_name(language)
+	except ClassNotFound : return ''
+	try : formatter = HtmlFormatter(style = style, noclasses = True)
+	except ClassNotFound : formatter = HtmlFormatter(noclasses = True)
+	return highlight(code, lexer, formatter)
+
+def _highlight_worker () :
+	stdin, stdout = getattr(sys.stdin, 'buffer', sys.stdin), getattr(sys.stdout, 'buffer', sys.stdout)
+	while True :
+		try : task = pickle.load(stdin)
+		except EOFError : return
+		pickle.dump(_highlight(task), stdout, 2)
+		stdout.flush()
+
+_highlighter = None
+
+def default_highlighter () :
+	global _highlighter
+	if _highlighter is None : _highlighter = Highlighter(workers = 0 if multiprocessing.current_process().daemon else None)
+	return _highlighter
+
+
+
+class Highlighter (object) :
+
+	LARGE = 16 * 1024
+	TIMEOUT = 60
+	SIZE = 32 * 1024 * 1024
+	MEMORY = 1024
+	CODE = re.compile(r'<pre><code class="(?:language-)?([\w+#.-]+)">(.*?)</code></pre>', re.S)
+	ENTITIES = (('&lt;', '<'), ('&gt;', '>'), ('&quot;', '"'), ('&amp;', '&'))
+
+	def __init__ (self, path = None, workers = None) :
+		self.cache = RenderCache(path or cache_path('highlight'), self.SIZE)
+		self.workers = workers
+		self._lock = threading.Lock()
+		self._memory = OrderedDict()
+		self._pool = None
+
+	def key (self, language, code, style) : return hashlib.sha1("\0".join((language, style, code)).encode('utf-8')).hexdigest()
+
+	def submit (self, html, style) :
+		matches = list(self.CODE.finditer(html))
+		if not matches : return html
+		keys, results, tasks = [], {}, []
+		for match in matches :
+			code = match.group(2)
+			for entity, char in self.ENTITIES : code = code.replace(entity, char)
+			task = match.group(1).lower(), code, style
+			key = self.key(*task)
+			keys.append(key)
+			if key not in results :
+				results[key] = self._get(key)
+				if results[key] is None :
+					if len(code) >= self.LARGE and self.workers != 0 : tasks.append((key, task))
+					else : results[key] = self._set(key, _highlight(task))
+		result = HighlightResult(self, html, matches, keys, results)
+		pending = self._map([task for key, task in tasks]) if tasks else None
+		if pending is None :
+			for key, task in tasks : results[key] = self._set(key, _highlight(task))
+			return result.get()
+		result.resolve(tasks, pending)
+		return result
+
+	def close (self) :
+		with self._lock :
+			if self._pool :
+				self._pool.terminate()
+				self._pool = None
+
+	def _map (self, tasks) :
+		with self._lock :
+			if self.workers == 0 : return None
+			if self._pool is None :
+				try : self._pool = HighlightWorkers(self.workers or min(4, multiprocessing.cpu_count()))
+				except Exception :
+					self.workers = 0
+					return None
+			return self._pool.map(tasks)
+
+	def _get (self, key) :
+		with self._lock :
+			html = self._memory.pop(key, None)
+			if html is not None :
+				self._memory[key] = html
+				return html
+		html = self.cache.get(key)
+		if html is not None : self._remember(key, html)
+		return html
+
+	def _set (self, key, html) :
+		self._remember(key, html)
+		self.cache.set(key, html)
+		return html
+
+	def _remember (self, key, html) :
+		with self._lock :
+			self._memory[key] = html
+			while len(self._memory) > self.MEMORY : self._memory.popitem(False)
+
+
+
+class HighlightWorkers (object) :
+
+	COMMAND = "import sys; sys.path.insert(0, {0!r}); import mdview_core; mdview_core._highlight_worker()"
+
+	def __init__ (self, count) :
+		self.tasks = queue.Queue()
+		self.processes = []
+		command = [sys.executable, '-c', self.COMMAND.format(os.path.dirname(os.path.abspath(__file__)))]
+		try :
+			for n in range(count) :
+				process = subprocess.Popen(command, stdin = subprocess.PIPE, stdout = subprocess.PIPE, close_fds = True)
+				self.processes.append(process)
+				thread = threading.Thread(target = self._run, args = (process,))
+				thread.daemon = True
+				thread.start()
+		except :
+			self.terminate()
+			raise
+
+	def map (self, tasks) :
+		result = HighlightTasks(len(tasks))
+		for index, task in enumerate(tasks) : self.tasks.put((result, index, task))
+		return result
+
+	def terminate (self) :
+		for process in self.processes :
+			self.tasks.put(None)
+			try : process.kill()
+			except OSError : pass
+		self.processes = []
+
+	def _run (self, process) :
+		while True :
+			item = self.tasks.get()
+			if item is None : return
+			result, index, task = item
+			try :
+				pickle.dump(task, process.stdin, 2)
+				process.stdin.flush()
+				result.set(index, pickle.load(process.stdout))
+			except Exception :
+				result.fail()
+				return
+
+
+
+class HighlightTasks (object) :
+
+	def __init__ (self, count) :
+		self.results = [None] * count
+		self.count = count
+		self.failed = False
+		self._done = threading.Event()
+		self._lock = threading.Lock()
+		if not count : self._done.set()
+
+	def set (self, index, html) :
+		with self._lock :
+			self.results[index] = html
+			self.count -= 1
+			if not self.count : self._done.set()
+
+	def fail (self) :
+		self.failed = True
+		self._done.set()
+
+	def get (self, timeout = None) :
+		if not self._done.wait(timeout) : raise multiprocessing.TimeoutError()
+		if self.failed : raise RuntimeError("highlight worker failed")
+		return self.results
+
+
+
+class HighlightResult (object) :
+
+	def __init__ (self, highlighter, html, matches, keys, results) :
+		self.highlighter = highlighter
+		self.html = html
+		self.matches = matches
+		self.keys = keys
+		self.results = results
+		self._pending = None
+
+	def resolve (self, tasks, pending) : self._pending = tasks, pending
+
+	def get (self) :
+		if self._pending :
+			tasks, pending = self._pending
+			self._pending = None
+			try : htmls = pending.get(self.highlighter.TIMEOUT)
+			except Exception :
+				self.highlighter.close()
+				htmls = [_highlight(task) for key, task in tasks]
+			for (key, task), html in zip(tasks, htmls) : self.results[key] = self.highlighter._set(key, html)
+		parts, end = [], 0
+		for match, key in zip(self.matches, self.keys) :
+			parts.append(self.html[end:match.start()])
+			parts.append(self.results.get(key) or match.group(0))
+			end = match.end()
+		parts.append(self.html[end:])
+		return ''.join(parts)
+
+
+
+class RenderCache (object) :
+
+	SIZE = 256 * 1024 * 1024
+
+	def __init__ (self, path = None, size = SIZE) :
+		if not path : path = cache_path('render')
+		self.path = path
+		self.size = size
+		self.hits = 0
+		self.misses = 0
+		self._lock = threading.Lock()
+		self._total = None
+		self._version = None
+		self._files = {}
+
+	def key (self, digest, options) :
+		if self._version is None : self._version = "{0} {1}".format(__version__, markdown_version()).encode('utf-8')
+		return hashlib.sha1(digest + options_key(options).encode('utf-8') + self._version).hexdigest()
+
+	def get (self, key) :
+		path = os.path.join(self.path, key)
+		try :
+			with open(path, 'r', 'utf-8') as f : blocks = json.load(f)
+			os.utime(path, None)
+		except :
+			self.misses += 1
+			return None
+		self.hits += 1
+		return blocks
+
+	def total (self) :
+		with self._lock :
+			if self._total is None :
+				try : self._total = sum(entry[1] for entry in self.entries())
+				except OSError : return 0
+			return self._total
+
+	def set (self, key, blocks, file = None) :
+		try :
+			if not os.path.isdir(self.path) : os.makedirs(self.path)
+			fd, temp = tempfile.mkstemp('.tmp', key, self.path)
+			with os.fdopen(fd, 'wb') as f : f.write(json.dumps(blocks).encode('utf-8'))
+			path = os.path.join(self.path, key)
+			size = os.path.getsize(temp) - self._size(path)
+			os.rename(temp, path)
+			with self._lock :
+				old = self._files.pop(file, None) if file else None
+				if file : self._files[file] = key
+				if old == key or old in self._files.values() : old = None
+			if old :
+				path = os.path.join(self.path, old)
+				try :
+					old_size = os.path.getsize(path)
+					os.remove(path)
+					size -= old_size
+				except OSError : pass
+			self._evict(size)
+		except : pass
+
+	@staticmethod
+	def _size (path) :
+		try : return os.path.getsize(path)
+		except OSError : return 0
+
+	def entries (self) :
+		entries = []
+		for name in os.listdir(self.path) :
+			if not name.endswith('.tmp') and len(name) == 40 :
+				try :
+					stat = os.stat(os.path.join(self.path, name))
+					entries.append((stat.st_mtime, stat.st_size, name))
+				except : pass
+		return entries
+
+	def stats (self) :
+		stats = {'hits': 0, 'misses': 0}
+		try :
+			with open(os.path.join(self.path, 'stats'), 'r', 'utf-8') as f : stats.update(json.load(f))
+		except : pass
+		try : entries = self.entries()
+		except : entries = []
+		stats['hits'] += self.hits
+		stats['misses'] += self.misses
+		stats['entries'] = len(entries)
+		stats['size'] = sum(entry[1] for entry in entries)
+		return stats
+
+	def flush (self) :
+		if self.hits or self.misses :
+			stats = self.stats()
+			try :
+				with open(os.path.join(self.path, 'stats'), 'w', 'utf-8') as f : json.dump({'hits': stats['hits'], 'misses': stats['misses']}, f)
+				self.hits = self.misses = 0
+			except : pass
+
+	def _evict (self, size) :
+		with self._lock :
+			if self._total is None : self._total = sum(entry[1] for entry in self.entries())
+			else : self._total += size
+			if self._total > self.size :
+				for mtime, size, name in sorted(self.entries()) :
+					if self._total <= self.size * 3 // 4 : break
+					try :
+						os.remove(os.path.join(self.path, name))
+						self._total -= size
+					except : pass
+
+
+_NETWORK_FILESYSTEMS = ('9p', 'afs', 'ceph', 'cifs', 'glusterfs', 'ncpfs', 'nfs', 'nfs4', 'smb3', 'smbfs', 'sshfs')
+
+def filesystem_type (path) :
+	path, found, fstype = os.path.realpath(path), '', None
+	try :
+		with open('/proc/self/mounts', 'r') as f :
+			for line in f :
+				fields = line.split()
+				if len(fields) < 3 : continue
+				mount = fields[1].replace('\\040', ' ')
+				if len(mount) >= len(found) and (path == mount or path.startswith(mount.rstrip('/') + '/')) : found, fstype = mount, fields[2]
+	except (IOError, OSError) : pass
+	return fstype
+
+def is_network_filesystem (path) :
+	fstype = filesystem_type(path)
+	return bool(fstype) and (fstype in _NETWORK_FILESYSTEMS or fstype.startswith('fuse'))
+
+
+def file_state (path) :
+	try : st = os.stat(path)
+	except OSError : return None
+	return st.st_size, getattr(st, 'st_mtime_ns', int(st.st_mtime * 1000000000)), st.st_ino
+
+def file_digest (path) :
+	digest = hashlib.sha1()
+	try :
+		with open(path, 'rb') as f :
+			for chunk in iter(lambda : f.read(1024 * 1024), b'') : digest.update(chunk)
+	except (IOError, OSError) : return None
+	return digest.digest()
+
+_poller = None
+
+def default_poller () :
+	global _poller
+	if _poller is None : _poller = FilePoller()
+	return _poller
+
+
+
+class FilePoller (object) :
+
+	MIN_INTERVAL = 0.25
+	MAX_INTERVAL = 30.0
+	SLACK = 0.5
+
+	clock = staticmethod(getattr(time, 'monotonic', time.time))
+
+	def __init__ (self) :
+		self.files = set()
+		self.polls = 0
+		self._source = None
+		self._due = None
+
+	def watch (self, path, changed) :
+		polled = PolledFile(self, path, changed)
+		self.files.add(polled)
+		self._schedule()
+		return polled
+
+	def remove (self, polled) :
+		self.files.discard(polled)
+		self._schedule()
+
+	def _schedule (self) :
+		from gi.repository import GLib
+		due = min(polled.due for polled in self.files) if self.files else None
+		if self._source and due is not None and self._due <= due : return
+		if self._source : GLib.source_remove(self._source)
+		self._source, self._due = None, due
+		if due is None : return
+		delay = max(0, due - self.clock())
+		if delay >= 1 : self._source = GLib.timeout_add_seconds(int(delay + self.SLACK), self.on_timeout)
+		else : self._source = GLib.timeout_add(int(delay * 1000), self.on_timeout)
+
+	def on_timeout (self) :
+		self._source = None
+		now = self.clock()
+		for polled in [polled for polled in self.files if polled.due <= now + self.SLACK] :
+			self.polls += 1
+			polled.poll(now)
+		self._schedule()
+		return False
+
+
+
+class PolledFile (object) :
+
+	def __init__ (self, poller, path, changed) :
+		self.poller = poller
+		self.path = path
+		self.changed = changed
+		self.state = file_state(path)
+		self.digest = None
+		self.interval = poller.MIN_INTERVAL
+		self.due = poller.clock() + self.interval
+		self._hashing = False
+		if self.state : self._hash(self.state, False)
+
+	def cancel (self) : self.poller.remove(self)
+
+	def poll (self, now) :
+		if not self._hashing :
+			state = file_state(self.path)
+			if state == self.state : self.interval = min(self.interval * 2, self.poller.MAX_INTERVAL)
+			else :
+				self.interval = self.poller.MIN_INTERVAL
+				if state : self._hash(state, True)
+				else : self.state = self.digest = None
+		self.due = now + self.interval
+
+	def _hash (self, state, notify) :
+		self._hashing = True
+		thread = threading.Thread(target = self._hash_file, args = (state, notify))
+		thread.daemon = True
+		thread.start()
+
+	def _hash_file (self, state, notify) :
+		from gi.repository import GLib
+		digest = file_digest(self.path)
+		if file_state(self.path) != state : digest = None
+		GLib.idle_add(self.on_hashed, state, digest, notify)
+
+	def on_hashed (self, state, digest, notify) :
+		self._hashing = False
+		changed = digest is None or digest != self.digest
+		self.state, self.digest = state, digest
+		if notify and changed and self in self.poller.files : self.changed(self)
+		return False
+
+
+
+class FileWatcher (object) :
+
+	BACKENDS = ('auto', 'monitor', 'poll')
+
+	def __init__ (self, file, changed, delay = 100, timings = None, backend = 'auto') :
+		self.file = file
+		self.changed = changed
+		self.delay = delay
+		self.timings = timings
+		self.backend = backend
+		self.monitor = None
+		self._moved_file = None
+		self._new_monitor = False
+		self._source = None
+		self._setup()
+
+	def set_backend (self, backend) :
+		if backend != self.backend :
+			self.backend = backend
+			self._setup()
+
+	def _setup (self) :
+		from gi.repository import Gio
+		if self.monitor : self.monitor.cancel()
+		if self.backend == 'poll' or self.backend == 'auto' and is_network_filesystem(self.file) :
+			self.monitor = default_poller().watch(self.file, self.on_file_polled)
+			return
+		self.monitor = Gio.File.new_for_path(self.file).monitor_file(Gio.FileMonitorFlags.SEND_MOVED | Gio.FileMonitorFlags.WATCH_HARD_LINKS, None)
+		self.monitor.connect('changed', self.on_file_changed)
+
+	def cancel (self) :
+		from gi.repository import GLib
+		if self.monitor : self.monitor.cancel()
+		if self._source : GLib.source_remove(self._source)
+		self._source = None
+
+	def on_file_changed (self, monitor, file, new_file, event) :
+		from gi.repository import Gio, GLib
+		if event == Gio.FileMonitorEvent.CHANGES_DONE_HINT : pass
+		elif event == Gio.FileMonitorEvent.CREATED :
+			self._moved_file = None
+			self._new_monitor = True
+		elif event == Gio.FileMonitorEvent.MOVED : self._moved_file = new_file.get_path()
+		else : return
+		if self._source : GLib.source_remove(self._source)
+		elif self.timings : self.timings.start('dispatch', self)
+		self._source = GLib.timeout_add(self.delay, self.on_timeout)
+
+	def on_file_polled (self, polled) : self.changed(None)
+
+	def on_timeout (self) :
+		moved_file, new_monitor = self._moved_file, self._new_monitor
+		self._source = self._moved_file = None
+		self._new_monitor = False
+		if self.timings : self.timings.stop('dispatch', self, file = self.file)
+		if moved_file : self.file = moved_file
+		if moved_file or new_monitor : self._setup()
+		self.changed(moved_file)
+		return False
+
+
+
+_ATX = re.compile(r'^(#{1,6})[ \t]*(.+?)[ \t]*#*[ \t]*$')
+_SETEXT = re.compile(r'^(=+|-+)[ \t]*$')
+_FENCE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+
+def markdown_headings (text) :
+	headings, fence, previous = [], None, ''
+	for line in text.splitlines() :
+		match = _FENCE.match(line)
+		if match and (fence is None or match.group(1)[0] == fence[0] and len(match.group(1)) >= len(fence)) :
+			fence = match.group(1) if fence is None else None
+		elif fence is None :
+			match = _ATX.match(line)
+			if match : headings.append((len(match.group(1)), match.group(2)))
+			elif previous.strip() and not previous[:1].isspace() and _SETEXT.match(line) :
+				headings.append((1 if line[0] == '=' else 2, previous.strip()))
+				line = ''
+		previous = line
+	return headings
+
+
+_LINK = re.compile(r'<a\b[^>]*?\bhref\s*=\s*(["\'])(.*?)\1', re.I)
+
+def local_markdown_path (url, base) :
+	parsed = urlparse(url.replace('&amp;', '&'))
+	if parsed.scheme == 'file' : path = unquote(parsed.path)
+	elif parsed.scheme or parsed.netloc or not parsed.path : return None
+	else : path = os.path.join(base, unquote(parsed.path))
+	if path.endswith('.md') : return os.path.normpath(path)
+
+def markdown_links (html, base) :
+	links = OrderedDict()
+	for match in _LINK.finditer(html) :
+		path = local_markdown_path(match.group(2), base)
+		if path and os.path.isfile(path) : links[path] = None
+	return list(links)
+
+
+
+class Workspace (object) :
+
+	def __init__ (self, root, limit = None) :
+		self.root = os.path.abspath(root)
+		self.limit = limit
+		self.files = {}
+		self.directories = set()
+		self.monitors = {}
+		self.changed = None
+		self._lock = threading.Lock()
+		self._updates = None
+
+	def scan (self, root = None) :
+		seen = set()
+		for path, dirs, names in os.walk(root or self.root) :
+			dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+			with self._lock : self.directories.add(path)
+			for name in names :
+				if name.endswith('.md') :
+					seen.add(os.path.join(path, name))
+					self.update(os.path.join(path, name))
+		if not root :
+			with self._lock : removed = set(self.files) - seen
+			for path in removed : self.remove(path)
+
+	def update (self, path) :
+		try :
+			stat = os.stat(path)
+			entry = self.files.get(path)
+			if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size : return False
+			with TextFile(path, self.limit) as f : headings = markdown_headings(f.decode())
+		except Exception : return self.remove(path)
+		titles = [text for level, text in headings if level == 1] or [text for level, text in headings]
+		entry = {'mtime': stat.st_mtime, 'size': stat.st_size, 'title': titles[0] if titles else os.path.basename(path), 'headings': headings}
+		with self._lock : self.files[path] = entry
+		return True
+
+	def remove (self, path) :
+		prefix = path + os.sep
+		with self._lock :
+			removed = [name for name in self.files if name == path or name.startswith(prefix)]
+			for name in removed : del self.files[name]
+			for name in [name for name in self.directories if name == path or name.startswith(prefix)] :
+				self.directories.discard(name)
+				monitor = self.monitors.pop(name, None)
+				if monitor : monitor.cancel()
+		return bool(removed)
+
+	def find (self, query, limit = 100) :
+		words = query.lower().split()
+		with self._lock : files = list(self.files.items())
+		results = []
+		for path, entry in files :
+			name = os.path.relpath(path, self.root)
+			title = entry['title'].lower()
+			text = title + ' ' + name.lower()
+			if all(word in text for word in words) : rank = 0 if not words or title.startswith(words[0]) else 1
+			elif all(word in text + ' ' + ' '.join(heading for level, heading in entry['headings']).lower() for word in words) : rank = 2
+			else : continue
+			results.append((rank, len(name), name, path, entry['title']))
+		return [(path, name, title) for rank, size, name, path, title in sorted(results)[:limit]]
+
+	def watch (self, changed = None) :
+		self.changed = changed
+		with self._lock : directories = sorted(self.directories)
+		for directory in directories : self._monitor(directory)
+
+	def cancel (self) :
+		with self._lock :
+			for monitor in self.monitors.values() : monitor.cancel()
+			self.monitors.clear()
+		self.changed = None
+		if self._updates : self._updates.put(None)
+		self._updates = None
+
+	def _monitor (self, directory) :
+		from gi.repository import Gio
+		if directory not in self.monitors :
+			monitor = Gio.File.new_for_path(directory).monitor_directory(Gio.FileMonitorFlags.SEND_MOVED, None)
+			monitor.connect('changed', self.on_directory_changed)
+			self.monitors[directory] = monitor
+
+	def on_directory_changed (self, monitor, file, other_file, event) :
+		from gi.repository import Gio
+		path = file.get_path()
+		if event in (Gio.FileMonitorEvent.DELETED, Gio.FileMonitorEvent.MOVED) :
+			self.remove(path)
+			if event == Gio.FileMonitorEvent.MOVED and other_file : path = other_file.get_path()
+			else : path = None
+		elif event not in (Gio.FileMonitorEvent.CREATED, Gio.FileMonitorEvent.CHANGES_DONE_HINT) : return
+		if path and not os.path.basename(path).startswith('.') and (path.endswith('.md') or os.path.isdir(path)) :
+			if self._updates is None :
+				self._updates = queue.Queue()
+				thread = threading.Thread(target = self._update_paths, args = (self._updates,))
+				thread.daemon = True
+				thread.start()
+			self._updates.put((path, file.get_path()))
+		elif self.changed : self.changed(file.get_path())
+
+	def _update_paths (self, updates) :
+		from gi.repository import GLib
+		while True :
+			item = updates.get()
+			if item is None : return
+			path, changed = item
+			if os.path.isdir(path) : self.scan(path)
+			else : self.update(path)
+			GLib.idle_add(self._on_updated, path, changed)
+
+	def _on_updated (self, path, changed) :
+		if not self.changed : return
+		with self._lock : directories = [name for name in self.directories if name == path or name.startswith(path + os.sep)]
+		for directory in directories : self._monitor(directory)
+		self.changed(changed)
+
+
+
+class RecentRenders (object) :
+
+	LIMIT = 64 * 1024 * 1024
+
+	def __init__ (self, size = 32, limit = LIMIT) :
+		self.size = size
+		self.limit = limit
+		self.total = 0
+		self._lock = threading.Lock()
+		self._renders = OrderedDict()
+
+	def get (self, path, options, digest) :
+		with self._lock :
+			entry = self._renders.pop(path, None)
+			if entry is None : return None
+			self._renders[path] = entry
+			if entry[:2] == (options, digest) : return entry[2]
+
+	def set (self, path, options, digest, render) :
+		html, keys, fragments = render[:3]
+		size = len(html or '') + sum(len(fragments[key]) for key in keys)
+		with self._lock :
+			old = self._renders.pop(path, None)
+			if old : self.total -= old[3]
+			if size > self.limit : return
+			self._renders[path] = options, digest, render, size
+			self.total += size
+			while len(self._renders) > self.size or self.total > self.limit : self.total -= self._renders.popitem(False)[1][3]
+
+	def clear (self) :
+		with self._lock :
+			self._renders.clear()
+			self.total = 0
+
+
+
+class AssetCache (object) :
+
+	SIZE = 64 * 1024 * 1024
+	IMAGE = re.compile(r'(<img\b[^>]*?\bsrc\s*=\s*)(["\'])(.*?)\2', re.I)
+	LINK = re.compile(r'<link\b[^>]*>', re.I)
+	STYLESHEET = re.compile(r'\brel\s*=\s*["\']?stylesheet\b', re.I)
+	HREF = re.compile(r'(\bhref\s*=\s*)(["\'])(.*?)\2', re.I)
+	URL = re.compile(r'(url\(\s*)(["\']?)([^"\')]+)\2(\s*\))')
+
+	def __init__ (self, size = SIZE) :
+		self.size = size
+		self.encoded = 0
+		self._digests = {}
+		self._uris = OrderedDict()
+		self._total = 0
+		self._lock = threading.Lock()
+		self._local = threading.local()
+
+	def inline (self, html, base) :
+		def image (match) : return self._replace(match, base)
+		def link (match) :
+			if not self.STYLESHEET.search(match.group(0)) : return match.group(0)
+			return self.HREF.sub(image, match.group(0))
+		return self.LINK.sub(link, self.IMAGE.sub(image, html))
+
+	def data_uri (self, path) :
+		stat = os.stat(path)
+		key = path, stat.st_mtime, stat.st_size
+		with self._lock :
+			uri = self._get(self._digests.get(key))
+			if uri : return uri
+		with open(path, 'rb') as f : data = f.read()
+		mime = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+		digest = hashlib.sha1(data).hexdigest()
+		if mime == 'text/css' : digest += ':' + os.path.dirname(path)
+		with self._lock :
+			self._digests[key] = digest
+			uri = self._get(digest)
+			if uri : return uri
+		cycles = getattr(self._local, 'cycles', 0)
+		if mime == 'text/css' :
+			base, encoding = os.path.dirname(path), self._encoding()
+			encoding.add(os.path.realpath(path))
+			try : data = self.URL.sub(lambda match : self._replace(match, base), data.decode('utf-8', 'replace')).encode('utf-8')
+			finally : encoding.discard(os.path.realpath(path))
+		uri = "data:{0};base64,{1}".format(mime, base64.b64encode(data).decode('ascii'))
+		if getattr(self._local, 'cycles', 0) != cycles : return uri
+		with self._lock :
+			self.encoded += 1
+			self._uris[digest] = uri
+			self._total += len(uri)
+			while self._total > self.size and len(self._uris) > 1 : self._total -= len(self._uris.popitem(False)[1])
+		return uri
+
+	def clear (self) :
+		with self._lock :
+			self._digests.clear()
+			self._uris.clear()
+			self._total = 0
+
+	def total (self) : return self._total
+
+	def _encoding (self) :
+		if not hasattr(self._local, 'paths') : self._local.paths = set()
+		return self._local.paths
+
+	def _get (self, digest) :
+		uri = self._uris.pop(digest, None)
+		if uri : self._uris[digest] = uri
+		return uri
+
+	def _replace (self, match, base) :
+		url = match.group(3).replace('&amp;', '&')
+		parsed = urlparse(url)
+		if parsed.scheme == 'file' : path = unquote(parsed.path)
+		elif parsed.scheme or parsed.netloc or not parsed.path : return match.group(0)
+		else : path = os.path.join(base, unquote(parsed.path))
+		if os.path.realpath(path) in self._encoding() :
+			self._local.cycles = getattr(self._local, 'cycles', 0) + 1
+			return match.group(0)
+		try : uri = self.data_uri(os.path.normpath(path))
+		except (IOError, OSError) : return match.group(0)
+		return match.group(1) + match.group(2) + uri + match.group(2) + (match.group(4) if match.lastindex == 4 else '')
+
+
+
+class SearchIndex (object) :
+
+	VERSION = 1
+	WORD = re.compile(r'\w{2,}', re.U)
+	SNIPPET = 80
+	BLOCKS = 8
+
+	def __init__ (self, path = None) :
+		self.path = path or cache_path('search')
+		self.documents = {}
+		self.postings = {}
+		self._blocks = OrderedDict()
+		self._terms = {}
+		self._sorted = None
+		self._dirty = False
+		self._loaded = False
+		self._lock = threading.Lock()
+
+	def load (self) :
+		with self._lock :
+			if self._loaded : return
+			self._loaded = True
+			try :
+				with open(self.path, 'rb') as f : data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+				if data['version'] != self.VERSION : return
+			except : return
+			paths = [document[0] for document in data['documents']]
+			for document in data['documents'] : self.documents[document[0]] = document[1:]
+			for term, postings in data['postings'].items() :
+				self.postings[term] = dict((paths[posting[0]], posting[1:]) for posting in postings)
+				for posting in postings : self._terms.setdefault(paths[posting[0]], []).append(term)
+
+	def save (self) :
+		with self._lock :
+			if not self._dirty : return
+			ids = dict((path, i) for i, path in enumerate(self.documents))
+			data = {
+				'version': self.VERSION,
+				'documents': [[path] + document for path, document in self.documents.items()],
+				'postings': dict((term, [[ids[path]] + blocks for path, blocks in postings.items()]) for term, postings in self.postings.items()),
+			}
+			self._dirty = False
+		try :
+			directory = os.path.dirname(self.path)
+			if not os.path.isdir(directory) : os.makedirs(directory)
+			write_atomic(self.path, zlib.compress(json.dumps(data, separators = (',', ':')).encode('utf-8')))
+		except (IOError, OSError) : self._dirty = True
+
+	def index_file (self, path, limit = None, source = None, digest = None) :
+		self.load()
+		if source is None :
+			stat = os.stat(path)
+			document = self.documents.get(path)
+			if document and document[1:3] == [stat.st_mtime, stat.st_size] : return False
+			with TextFile(path, limit) as f : return self.index_file(path, limit, f)
+		document = self.documents.get(path)
+		digest = binascii.hexlify(digest or source.digest()).decode('ascii')
+		if document and document[0] == digest :
+			with self._lock : document[1:3] = [source.mtime, source.size]
+			return False
+		self.update(path, source.decode(), digest, source.mtime, source.size)
+		return True
+
+	def update (self, path, text, digest, mtime, size) :
+		blocks, postings, indexed = [], {}, {}
+		with self._lock : previous = self._blocks.get(path, {})
+		for block in BlockRenderer(None).split(text) :
+			key = hashlib.sha1(block.encode('utf-8')).digest()
+			entry = indexed.get(key) or previous.get(key) or self._index_block(block)
+			indexed[key] = entry
+			label, terms = entry
+			if label is None : continue
+			for term in terms : postings.setdefault(term, []).append(len(blocks))
+			blocks.append(label)
+		with self._lock :
+			self._remove(path)
+			self._blocks[path] = indexed
+			while len(self._blocks) > self.BLOCKS : self._blocks.popitem(False)
+			for term, indices in postings.items() : self.postings.setdefault(term, {})[path] = indices
+			self._terms[path] = list(postings)
+			self.documents[path] = [digest, mtime, size, blocks]
+			self._sorted = None
+			self._dirty = True
+
+	def remove (self, path) :
+		with self._lock :
+			if path in self.documents :
+				self._remove(path)
+				self._sorted = None
+				self._dirty = True
+
+	def _index_block (self, block) :
+		lines = block.split('\n')
+		if all(BlockRenderer.REFERENCE.match(line) or line[:1].isspace() for line in lines) : return None, ()
+		match = _ATX.match(lines[0])
+		if match : label = [len(match.group(1)), match.group(2)]
+		elif len(lines) == 2 and _SETEXT.match(lines[1]) : label = [1 if lines[1][0] == '=' else 2, lines[0].strip()]
+		else : label = [0, ' '.join(block.split())[:self.SNIPPET]]
+		return label, tuple(set(self.WORD.findall(block.lower())))
+
+	def _remove (self, path) :
+		self._blocks.pop(path, None)
+		for term in self._terms.pop(path, ()) :
+			postings = self.postings[term]
+			del postings[path]
+			if not postings : del self.postings[term]
+		self.documents.pop(path, None)
+
+	def search (self, query, limit = 100, first = None) :
+		words = self.WORD.findall(query.lower())
+		if not words : return []
+		self.load()
+		with self._lock :
+			if self._sorted is None : self._sorted = sorted(self.postings)
+			hits = None
+			for n, word in enumerate(words, 1) :
+				if n == len(words) :
+					terms, i = [], bisect.bisect_left(self._sorted, word)
+					while i < len(self._sorted) and self._sorted[i].startswith(word) :
+						terms.append(self._sorted[i])
+						i += 1
+				else : terms = [word]
+				found = set()
+				for term in terms :
+					for path, blocks in self.postings.get(term, {}).items() : found.update((path, block) for block in blocks)
+				hits = found if hits is None else hits & found
+				if not hits : return []
+			results = []
+			for path, block in hits :
+				blocks = self.documents[path][3]
+				level, text = blocks[block]
+				heading = text if level else next((text for level, text in reversed(blocks[:block]) if level), '')
+				results.append(((path != first, not level, path, block), path, block, len(blocks), heading, text))
+		return [result[1:] for result in sorted(results)[:limit]]
+
+
+
+class StreamReader (object) :
+
+	CHUNK = 64 * 1024
+
+	def __init__ (self, path, received, closed = None) :
+		import fcntl
+		from gi.repository import GLib
+		self.path = path
+		self.received = received
+		self.closed = closed
+		self.fd = 0 if path == '-' else os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+		fcntl.fcntl(self.fd, fcntl.F_SETFL, fcntl.fcntl(self.fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+		self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+		self._source = GLib.io_add_watch(self.fd, GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self.on_io)
+
+	def close (self) :
+		from gi.repository import GLib
+		if self._source : GLib.source_remove(self._source)
+		self._source = None
+		if self.fd is not None and self.fd != 0 : os.close(self.fd)
+		self.fd = None
+
+	def on_io (self, fd, condition) :
+		try : data = os.read(self.fd, self.CHUNK)
+		except OSError as e :
+			if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR) : return True
+			data = b''
+		if data :
+			self.received(self._decoder.decode(data))
+			return True
+		self.received(self._decoder.decode(b'', True))
+		self._source = None
+		self.close()
+		if self.closed : self.closed()
+		return False
+
+
+
+class Timings (object) :
+
+	ENVIRON = "MDVIEW_TIMINGS"
+	WINDOW = 20
+	RETRY = 30
+	BACKLOG = 1000
+
+	clock = staticmethod(getattr(time, 'monotonic', time.time))
+
+	def __init__ (self, target = None) :
+		self.target = os.environ.get(self.ENVIRON) if target is None else target
+		self.last = OrderedDict()
+		self.history = {}
+		self._lock = threading.Lock()
+		self._failed = None
+		self._sink = None
+		self._records = None
+		self._started = {}
+
+	def start (self, phase, owner = None) : self._started[(phase, id(owner))] = self.clock()
+
+	def stop (self, phase, owner = None, **info) :
+		started = self._started.pop((phase, id(owner)), None)
+		if started is not None : return self.add(phase, self.clock() - started, **info)
+
+	@contextlib.contextmanager
+	def measure (self, phase, **info) :
+		started = self.clock()
+		try : yield
+		finally : self.add(phase, self.clock() - started, **info)
+
+	def add (self, phase, seconds, **info) :
+		with self._lock :
+			self.history.setdefault(phase, deque(maxlen = self.WINDOW)).append(seconds)
+			self.last.pop(phase, None)
+			self.last[phase] = seconds
+		self.emit(dict(info, phase = phase, ms = round(seconds * 1000, 3)))
+		return seconds
+
+	def average (self, phase) :
+		with self._lock :
+			history = self.history.get(phase)
+			return sum(history) / len(history) if history else None
+
+	def summary (self) :
+		with self._lock : last = list(self.last.items())
+		return "  ".join("{0} {1:.1f} ms ({2} {3:.1f})".format(phase, seconds * 1000, _("avg"), self.average(phase) * 1000) for phase, seconds in last)
+
+	def emit (self, record) :
+		if not self.target : return
+		record.update(time = time.time(), host = socket.gethostname(), pid = os.getpid())
+		line = (json.dumps(record, sort_keys = True) + "\n").encode('utf-8')
+		with self._lock :
+			if self._failed and self.clock() - self._failed < self.RETRY : return
+			if self._records is None :
+				self._records = queue.Queue(self.BACKLOG)
+				thread = threading.Thread(target = self._send, args = (self._records,))
+				thread.daemon = True
+				thread.start()
+		try : self._records.put_nowait(line)
+		except queue.Full : pass
+
+	def _send (self, records) :
+		while True :
+			line = records.get()
+			if self._failed and self.clock() - self._failed < self.RETRY : continue
+			try :
+				if self._sink is None : self._sink = self._open(self.target)
+				self._sink(line)
+				self._failed = None
+			except (IOError, OSError, socket.error) :
+				self._failed, self._sink = self.clock(), None
+
+	def _open (self, target) :
+		scheme, sep, address = target.partition("://")
+		if not sep :
+			f = open(target, 'ab')
+			def write (line) :
+				f.write(line)
+				f.flush()
+			return write
+		if scheme == 'unix' :
+			sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			sock.settimeout(1)
+			sock.connect(address)
+		else :
+			host, port = address.rsplit(':', 1)
+			if scheme == 'tcp' : sock = socket.create_connection((host, int(port)), 1)
+			elif scheme == 'udp' :
+				sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+				sock.connect((host, int(port)))
+			else : raise IOError(_("Unknown timing target {0}").format(target))
+		return sock.sendall
+
+
+
+class StageProfiler (object) :
+
+	STAGES = (('preprocessor', 'preprocessors'), ('block', 'parser.blockprocessors'), ('inline', 'inlinePatterns'), ('treeprocessor', 'treeprocessors'), ('postprocessor', 'postprocessors'))
+	METHODS = ('test', 'run', 'handleMatch')
+
+	clock = staticmethod(getattr(time, 'perf_counter', time.time))
+
+	def __init__ (self, prefix = None) :
+		self.prefix = prefix
+		self.stats = {}
+		self.folded = {}
+		self._stack = []
+		self._lock = threading.Lock()
+
+	def reset (self) :
+		with self._lock :
+			self.stats = {}
+			self.folded = {}
+
+	def wrap (self, md) :
+		md.convert = self._timed('convert', md.convert)
+		for kind, path in self.STAGES :
+			registry = md
+			for attr in path.split('.') : registry = getattr(registry, attr)
+			for name, stage in list((registry._data if hasattr(registry, '_data') else registry).items()) :
+				name = kind + ':' + name
+				for method in self.METHODS :
+					if hasattr(stage, method) : setattr(stage, method, self._timed(name, getattr(stage, method)))
+				if hasattr(stage, 'getCompiledRegExp') :
+					regexp = _TimedRegExp(self, name, stage.getCompiledRegExp())
+					stage.getCompiledRegExp = lambda regexp = regexp : regexp
+		return md
+
+	def _timed (self, name, function) :
+		def timed (*args, **kwargs) :
+			frame = [name, 0]
+			self._stack.append(frame)
+			start = self.clock()
+			try : return function(*args, **kwargs)
+			finally :
+				elapsed = self.clock() - start
+				self._stack.pop()
+				self.add(name, [outer[0] for outer in self._stack], elapsed, elapsed - frame[1])
+				if self._stack : self._stack[-1][1] += elapsed
+		return timed
+
+	def add (self, name, outer, elapsed, own) :
+		stack = ';'.join(([self.prefix] if self.prefix else []) + outer + [name])
+		with self._lock :
+			stats = self.stats.setdefault(name, [0, 0.0])
+			stats[0] += 1
+			if name not in outer : stats[1] += elapsed
+			self.folded[stack] = self.folded.get(stack, 0.0) + own
+
+	def total (self) : return self.stats.get('convert', (0, 0.0))[1]
+
+	def report (self, limit = None) :
+		with self._lock : stats = sorted(self.stats.items(), key = lambda item : (-item[1][1], item[0]))
+		return [(name, calls, seconds) for name, (calls, seconds) in stats if name != 'convert'][:limit]
+
+	def summary (self, limit = 3) :
+		return "  ".join("{0} {1:.1f} ms ×{2}".format(name, seconds * 1000, calls) for name, calls, seconds in self.report(limit))
+
+	def write_report (self, f) :
+		f.write("{0:>12} {1:>10}  {2}\n".format("ms", "calls", "stage"))
+		for name, calls, seconds in self.report() : f.write("{0:12.3f} {1:10d}  {2}\n".format(seconds * 1000, calls, name))
+
+	def write_folded (self, f) :
+		with self._lock : folded = sorted(self.folded.items())
+		for stack, seconds in folded : f.write("{0} {1}\n".format(stack.replace(' ', '_'), int(round(seconds * 1000000))))
+
+
+class _TimedRegExp (object) :
+
+	def __init__ (self, profiler, name, regexp) :
+		self.match = profiler._timed(name, regexp.match)
+		self._regexp = regexp
+
+	def __getattr__ (self, name) : return getattr(self._regexp, name)
+
+
+
+def option_flips (options) :
+	for key in MarkdownOptions.KEYS :
+		attr = getattr(MarkdownOptions, key)
+		if bool == attr : yield "{0}={1}".format(key, not options[key]), dict(options, **{key: not options[key]})
+		elif tuple == type(attr) :
+			for value in attr :
+				if value != options[key] : yield "{0}={1}".format(key, value), dict(options, **{key: value})
+
+def profile (source, options, each_option = False, repeat = 1, out = None, cprofile = None, flamegraph = None) :
+	with TextFile(source) as f : text = f.decode()
+	variants = [("options", options)]
+	if each_option : variants += list(option_flips(options))
+	profilers, collector = [], None
+	if cprofile :
+		import cProfile
+		collector = cProfile.Profile()
+	try :
+		for label, variant in variants :
+			profiler = StageProfiler(label if each_option else None)
+			renderer = BlockRenderer(profiler.wrap(create_markdown(variant)), variant)
+			if collector : collector.enable()
+			try :
+				for run in range(repeat) :
+					renderer.fragments = {}
+					renderer.convert(text)
+			finally :
+				if collector : collector.disable()
+			profilers.append(profiler)
+			if out :
+				out.write("{0}: {1:.3f} ms in {2} runs\n".format(label, profiler.total() * 1000, repeat))
+				profiler.write_report(out)
+				out.write("\n")
+	finally :
+		if any(variant.get('highlight') for label, variant in variants) : default_highlighter().close()
+	if collector : collector.dump_stats(cprofile)
+	if flamegraph :
+		with open(flamegraph, 'w', 'utf-8') as f :
+			for profiler in profilers : profiler.write_folded(f)
+	return profilers
+
+
+
+def settings_options (options = None) :
+	if options is None : options = MarkdownOptions()
+	for key in MarkdownOptions.KEYS : options.set(key, MarkdownOptions.DEFAULTS[key])
+	gsettings = settings()
+	if gsettings :
+		for key in MarkdownOptions.KEYS : options.set_nick(key, gsettings.get_value(key.replace('_', '-')).unpack())
+	return options
+
+
+EXPORT_MANIFEST = ".mdview-export"
+
+_exporter = None
+_assets = None
+
+def _export_init (options, inline = False) :
+	global _exporter, _assets
+	_exporter = BlockRenderer(create_markdown(options), options)
+	_assets = AssetCache() if inline else None
+
+def _export_file (task) :
+	source, target, digest = task
+	try :
+		with TextFile(source) as f :
+			new_digest = binascii.hexlify(f.digest()).decode('ascii')
+			if new_digest == digest and os.path.exists(target) : return source, new_digest, False
+			text = f.decode()
+		directory = os.path.dirname(target)
+		try : os.makedirs(directory)
+		except OSError :
+			if not os.path.isdir(directory) : raise
+		fd, temp = tempfile.mkstemp('.tmp', '.' + os.path.basename(target), directory)
+		try :
+			copy_mode(fd, target)
+			with os.fdopen(fd, 'wb') as f :
+				for i, (key, html) in enumerate(_exporter.iterconvert(text)) :
+					if i : f.write(b'\n')
+					if _assets : html = _assets.inline(html, os.path.dirname(os.path.abspath(source)))
+					f.write(html.encode('utf-8'))
+			os.rename(temp, target)
+		except :
+			os.remove(temp)
+			raise
+		return source, new_digest, True
+	except Exception as e : return source, None, e
+
+def export (source, target, options, jobs = None, log = None, inline = False) :
+	if os.path.isdir(source) :
+		root, files = target, []
+		for path, dirs, names in os.walk(source) :
+			dirs.sort()
+			for name in sorted(names) :
+				if name.endswith('.md') :
+					name = os.path.relpath(os.path.join(path, name), source)
+					files.append((os.path.join(source, name), os.path.splitext(name)[0] + '.html'))
+	else :
+		if os.path.isdir(target) : target = os.path.join(target, os.path.splitext(os.path.basename(source))[0] + '.html')
+		root, files = os.path.dirname(os.path.abspath(target)), [(source, os.path.basename(target))]
+
+	manifest = {'options': options_key(options) + (" inline" if inline else ""), 'files': {}}
+	try :
+		with open(os.path.join(root, EXPORT_MANIFEST), 'r', 'utf-8') as f : old_manifest = json.load(f)
+		if old_manifest['options'] != manifest['options'] : old_manifest = {'files': {}}
+	except : old_manifest = {'files': {}}
+
+	tasks, names, stats = [], {}, {'converted': 0, 'unchanged': 0, 'failed': 0}
+	for source, name in files :
+		entry = old_manifest['files'].get(name)
+		stat = os.stat(source)
+		names[source] = name, [stat.st_size, stat.st_mtime]
+		if entry and entry[:2] == names[source][1] and os.path.exists(os.path.join(root, name)) :
+			manifest['files'][name] = entry
+			stats['unchanged'] += 1
+		else : tasks.append((source, os.path.join(root, name), entry[2] if entry else None))
+
+	if not jobs : jobs = multiprocessing.cpu_count()
+	if jobs == 1 or len(tasks) < 2 :
+		pool = None
+		_export_init(options, inline)
+		results = map(_export_file, tasks)
+	else :
+		context = multiprocessing.get_context('fork') if hasattr(multiprocessing, 'get_context') else multiprocessing
+		pool = context.Pool(min(jobs, len(tasks)), _export_init, (options, inline))
+		results = pool.imap_unordered(_export_file, tasks, 8)
+	try :
+		for source, digest, converted in results :
+			name, stat = names[source]
+			if isinstance(converted, Exception) :
+				stats['failed'] += 1
+				if log : log(_("Failed writing file {0}: {1}").format(os.path.join(root, name), converted))
+				continue
+			manifest['files'][name] = stat + [digest]
+			stats['converted' if converted else 'unchanged'] += 1
+	finally :
+		if pool :
+			pool.close()
+			pool.join()
+		try :
+			fd, temp = tempfile.mkstemp('.tmp', EXPORT_MANIFEST, root)
+			copy_mode(fd, os.path.join(root, EXPORT_MANIFEST))
+			with os.fdopen(fd, 'wb') as f : f.write(json.dumps(manifest).encode('utf-8'))
+			os.rename(temp, os.path.join(root, EXPORT_MANIFEST))
+		except : pass
+	return stats
+
+def watch_export (source, target, options, delay = 100, log = None, inline = False, backend = 'auto') :
+	from gi.repository import GLib
+	renderer = BlockRenderer(create_markdown(options), options)
+	assets = AssetCache() if inline else None
+	def update (moved_file = None) :
+		try :
+			with TextFile(watcher.file) as f : html = renderer.convert(f.decode())
+			if assets : html = assets.inline(html, os.path.dirname(watcher.file))
+			if write_atomic(target, html.encode('utf-8')) and log : log(_("Wrote file {0}").format(target))
+		except Exception as e :
+			if log : log(_("Failed writing file {0}: {1}").format(target, e))
+	watcher = FileWatcher(os.path.abspath(source), update, delay, backend = backend)
+	update()
+	try : GLib.MainLoop().run()
+	except KeyboardInterrupt : pass
+	finally : watcher.cancel()
+
+
+LIVE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body><div id="mdview">{html}</div>{script}</body></html>
+"""
+
+LIVE_SCRIPT = """
+<script>
+var events = new EventSource(location.pathname + "?events={version}");
+events.onmessage = function (e) {{
+	var y = window.pageYOffset, bottom = y + window.innerHeight >= document.body.scrollHeight;
+	document.getElementById("mdview").innerHTML = e.data;
+	window.scrollTo(0, bottom ? document.body.scrollHeight : y);
+}};
+</script>
+"""
+
+def _escape (text) : return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+class LiveDocument (object) :
+
+	def __init__ (self, server, path) :
+		self.server = server
+		self.path = path
+		self.renderer = BlockRenderer(create_markdown(server.options), server.options)
+		self.html = None
+		self.event = None
+		self.version = 0
+		self.clients = []
+		self.render()
+		self.watcher = FileWatcher(path, self.on_file_changed, server.delay, server.timings, server.backend)
+
+	def render (self) :
+		started = self.server.timings.clock()
+		try :
+			with TextFile(self.path, self.server.max_file_size) as f : html = self.renderer.convert(f.decode())
+			if self.server.assets : html = self.server.assets.inline(html, os.path.dirname(self.path))
+		except Exception as e :
+			if self.server.log : self.server.log(_("Failed loading file {0}: {1}").format(self.path, e))
+			return False
+		self.server.timings.add('convert', self.server.timings.clock() - started, file = self.path, blocks = len(self.renderer.keys))
+		if html == self.html : return False
+		self.html, self.event = html, None
+		self.version += 1
+		return True
+
+	def message (self) :
+		if self.event is None : self.event = ("id: {0}\n".format(self.version) + "".join("data: " + line + "\n" for line in self.html.split("\n")) + "\n").encode('utf-8')
+		return self.event
+
+	def cancel (self) :
+		self.watcher.cancel()
+		for client in self.clients[:] : client.close()
+
+	def on_file_changed (self, moved_file) :
+		if not self.render() : return
+		started = self.server.timings.clock()
+		event = self.message()
+		for client in self.clients[:] : client.send(event)
+		self.server.timings.add('push', self.server.timings.clock() - started, file = self.path, clients = len(self.clients))
+
+
+
+class LiveClient (object) :
+
+	LIMIT = 8 * 1024
+	BACKLOG = 8 * 1024 * 1024
+
+	def __init__ (self, server, sock) :
+		from gi.repository import GLib
+		self.server = server
+		self.sock = sock
+		self.sock.setblocking(False)
+		self.document = None
+		self.condition = GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR
+		self.request = b''
+		self.buffer = b''
+		self.closing = False
+		self._source = GLib.io_add_watch(sock.fileno(), GLib.PRIORITY_DEFAULT, self.condition, self.on_io)
+
+	def send (self, data) :
+		from gi.repository import GLib
+		if self.sock is None : return
+		if not self.buffer :
+			try : data = data[self.sock.send(data):]
+			except socket.error as e :
+				if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR) : return self.close()
+		self.buffer += data
+		if len(self.buffer) > self.BACKLOG : return self.close()
+		if self.buffer : self._watch(GLib.IO_OUT | GLib.IO_HUP | GLib.IO_ERR)
+		elif self.closing : self.close()
+		else : self._watch(GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR)
+
+	def respond (self, status, body = b'', content_type = "text/html; charset=utf-8", headers = ()) :
+		head = ["HTTP/1.1 " + status, "Content-Type: " + content_type, "Content-Length: {0}".format(len(body)), "Connection: close"]
+		self.closing = True
+		self.send(("\r\n".join(head + list(headers)) + "\r\n\r\n").encode('latin-1') + body)
+
+	def close (self) :
+		from gi.repository import GLib
+		if self._source : GLib.source_remove(self._source)
+		self._source = None
+		if self.document and self in self.document.clients : self.document.clients.remove(self)
+		if self.sock : self.sock.close()
+		self.sock = None
+
+	def _watch (self, condition) :
+		from gi.repository import GLib
+		if self._source :
+			if condition == self.condition : return
+			GLib.source_remove(self._source)
+		self.condition = condition
+		self._source = GLib.io_add_watch(self.sock.fileno(), GLib.PRIORITY_DEFAULT, condition, self.on_io)
+
+	def on_io (self, fd, condition) :
+		from gi.repository import GLib
+		if condition & (GLib.IO_HUP | GLib.IO_ERR) :
+			self._source = None
+			self.close()
+			return False
+		if condition & GLib.IO_OUT :
+			try : self.buffer = self.buffer[self.sock.send(self.buffer):]
+			except socket.error as e :
+				if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR) : return True
+				self._source = None
+				self.close()
+				return False
+			if self.buffer : return True
+			self._source = None
+			if self.closing : self.close()
+			else : self._watch(GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR)
+			return False
+		try : data = self.sock.recv(self.LIMIT)
+		except socket.error as e :
+			if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR) : return True
+			data = b''
+		if not data or self.document :
+			self._source = None
+			self.close()
+			return False
+		self.request += data
+		if b"\r\n\r\n" not in self.request :
+			if len(self.request) < self.LIMIT : return True
+			self.respond("431 Request Header Fields Too Large")
+			return False
+		self._source = None
+		self.server.handle(self, self.request.split(b"\r\n", 1)[0].decode('latin-1').split())
+		return False
+
+
+
+class LiveServer (object) :
+
+	ASSETS = ('image/', 'text/css')
+	DOCUMENTS = 64
+	KEEPALIVE = 30
+
+	def __init__ (self, source, options, host = "127.0.0.1", port = 8000, delay = 100, max_file_size = None, log = None, inline = False, backend = 'auto') :
+		source = os.path.abspath(source)
+		self.root, self.index = (source, None) if os.path.isdir(source) else os.path.split(source)
+		self.options = options
+		self.delay = delay
+		self.backend = backend
+		self.max_file_size = max_file_size
+		self.log = log
+		self.assets = AssetCache() if inline else None
+		self.timings = Timings()
+		self.documents = OrderedDict()
+		self.sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+		self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self.sock.bind((host, port))
+		self.sock.listen(128)
+		self.sock.setblocking(False)
+		self.address = self.sock.getsockname()[:2]
+		self._sources = []
+
+	def start (self) :
+		from gi.repository import GLib
+		self._sources.append(GLib.io_add_watch(self.sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.on_accept))
+		self._sources.append(GLib.timeout_add_seconds(self.KEEPALIVE, self.on_keepalive))
+
+	def close (self) :
+		from gi.repository import GLib
+		for source in self._sources : GLib.source_remove(source)
+		self._sources = []
+		for document in self.documents.values() : document.cancel()
+		self.documents.clear()
+		self.sock.close()
+
+	def document (self, path) :
+		document = self.documents.pop(path, None)
+		if document is None : document = LiveDocument(self, path)
+		self.documents[path] = document
+		for key in [key for key, idle in self.documents.items() if not idle.clients][:max(0, len(self.documents) - self.DOCUMENTS)] :
+			self.documents.pop(key).cancel()
+		return document
+
+	def handle (self, client, request) :
+		if len(request) < 2 or request[0] not in ("GET", "HEAD") : return client.respond("405 Method Not Allowed")
+		url = urlparse(request[1])
+		name = unquote(url.path).lstrip('/')
+		path = os.path.normpath(os.path.join(self.root, name))
+		if path != self.root and not path.startswith(os.path.join(self.root, '')) : return client.respond("403 Forbidden")
+		if not name and self.index : return client.respond("302 Found", headers = ["Location: /" + self.index])
+		if name != self.index and any(part.startswith('.') for part in name.split('/')) : return client.respond("404 Not Found")
+		if os.path.isdir(path) :
+			if name and not url.path.endswith('/') : return client.respond("301 Moved Permanently", headers = ["Location: " + url.path + '/'])
+			return client.respond("200 OK", self.listing(path, name).encode('utf-8'))
+		if not os.path.isfile(path) : return client.respond("404 Not Found")
+		if path.endswith('.md') :
+			document = self.document(path)
+			if url.query.startswith("events") :
+				client.document = document
+				document.clients.append(client)
+				client.send(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n\r\nretry: 1000\n\n")
+				if document.html is not None and url.query != "events={0}".format(document.version) : client.send(document.message())
+				return
+			if document.html is None : return client.respond("500 Internal Server Error")
+			page = LIVE_PAGE.format(title = _escape(os.path.basename(path)), html = document.html, script = LIVE_SCRIPT.format(version = document.version))
+			return client.respond("200 OK", page.encode('utf-8'), headers = ["Cache-Control: no-cache"])
+		content_type = mimetypes.guess_type(path)[0]
+		if not content_type or not content_type.startswith(self.ASSETS) : return client.respond("404 Not Found")
+		try :
+			with open(path, 'rb') as f : body = f.read()
+		except (IOError, OSError) : return client.respond("404 Not Found")
+		client.respond("200 OK", body, content_type)
+
+	def listing (self, path, name) :
+		entries = []
+		for entry in sorted(os.listdir(path)) :
+			if entry.startswith('.') : continue
+			if os.path.isdir(os.path.join(path, entry)) : entry += '/'
+			elif not entry.endswith('.md') : continue
+			entries.append('<li><a href="{0}">{0}</a></li>'.format(_escape(entry)))
+		return LIVE_PAGE.format(title = _escape('/' + name), html = "<ul>" + "".join(entries) + "</ul>", script = "")
+
+	def on_accept (self, fd, condition) :
+		try :
+			while True : LiveClient(self, self.sock.accept()[0])
+		except socket.error as e :
+			if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR) and self.log : self.log(str(e))
+		return True
+
+	def on_keepalive (self) :
+		for document in self.documents.values() :
+			for client in document.clients[:] : client.send(b":\n\n")
+		return True
+
+def serve (source, options, host = "127.0.0.1", port = 8000, delay = 100, max_file_size = None, log = None, inline = False, backend = 'auto') :
+	from gi.repository import GLib
+	server = LiveServer(source, options, host, port, delay, max_file_size, log, inline, backend)
+	server.start()
+	if log : log(_("Serving {0} on http://{1}:{2}/").format(source, *server.address))
+	try : GLib.MainLoop().run()
+	except KeyboardInterrupt : pass
+	finally : server.close()
+
+
+def _add_option_arguments (parser) :
+	for key in MarkdownOptions.KEYS :
+		attr, flag = getattr(MarkdownOptions, key), '--' + key.replace('_', '-')
+		if bool == attr :
+			parser.add_argument(flag, dest = key, action = 'store_true', default = None)
+			parser.add_argument('--no-' + flag[2:], dest = key, action = 'store_false')
+		elif tuple == type(attr) : parser.add_argument(flag, dest = key, choices = [str(option) for option in attr])
+		else : parser.add_argument(flag, dest = key, type = attr)
+
+def _parsed_options (args) :
+	options = settings_options()
+	for key in MarkdownOptions.KEYS :
+		if getattr(args, key) is not None : options.set_nick(key, getattr(args, key))
+	return options.dict()
+
+def _log (msg) : sys.stderr.write(msg + "\n")
+
+def _change_detection (args, gsettings) : return args.change_detection or (gsettings.get_string("change-detection") if gsettings else 'auto')
+
+def export_main (argv) :
+	import argparse
+	parser = argparse.ArgumentParser(prog = __appname__ + " export", description = _("Convert Markdown files to HTML without a GUI."))
+	parser.add_argument('-j', '--jobs', type = int, help = _("number of worker processes"))
+	parser.add_argument('--inline', action = 'store_true', help = _("embed local images and stylesheets as data URIs"))
+	_add_option_arguments(parser)
+	parser.add_argument('source', help = _("Markdown file or directory"))
+	parser.add_argument('target', help = _("HTML file or directory"))
+	args = parser.parse_args(argv)
+
+	stats = export(args.source, args.target, _parsed_options(args), args.jobs, _log, args.inline)
+	_log(_("{converted} converted, {unchanged} unchanged, {failed} failed").format(**stats))
+	return 1 if stats['failed'] else 0
+
+def watch_export_main (argv) :
+	import argparse
+	parser = argparse.ArgumentParser(prog = __appname__ + " --watch-export", description = _("Keep an HTML file up to date with a Markdown file without a GUI."))
+	parser.add_argument('--inline', action = 'store_true', help = _("embed local images and stylesheets as data URIs"))
+	parser.add_argument('--change-detection', choices = FileWatcher.BACKENDS, help = _("monitor or poll the file for changes, by default poll on network file systems only"))
+	_add_option_arguments(parser)
+	parser.add_argument('source', help = _("Markdown file"))
+	parser.add_argument('target', help = _("HTML file"))
+	args = parser.parse_args(argv)
+
+	gsettings = settings()
+	watch_export(args.source, args.target, _parsed_options(args), gsettings.get_int("reload-delay") if gsettings else 100, _log, args.inline, _change_detection(args, gsettings))
+	return 0
+
+def serve_main (argv) :
+	import argparse
+	parser = argparse.ArgumentParser(prog = __appname__ + " serve", description = _("Serve live previews of Markdown files over HTTP without a GUI."))
+	parser.add_argument('--host', default = "127.0.0.1", help = _("address to listen on"))
+	parser.add_argument('-p', '--port', type = int, default = 8000, help = _("port to listen on"))
+	parser.add_argument('--inline', action = 'store_true', help = _("embed local images and stylesheets as data URIs"))
+	parser.add_argument('--change-detection', choices = FileWatcher.BACKENDS, help = _("monitor or poll files for changes, by default poll on network file systems only"))
+	_add_option_arguments(parser)
+	parser.add_argument('source', nargs = '?', default = os.curdir, help = _("Markdown file or directory"))
+	args = parser.parse_args(argv)
+
+	gsettings = settings()
+	serve(args.source, _parsed_options(args), args.host, args.port, gsettings.get_int("reload-delay") if gsettings else 100, (gsettings.get_int("max-file-size") if gsettings else 256) * 1024 * 1024, _log, args.inline, _change_detection(args, gsettings))
+	return 0
+
+def profile_main (argv) :
+	import argparse
+	parser = argparse.ArgumentParser(prog = __appname__ + " profile", description = _("Time every stage of the Markdown conversion of a file."))
+	parser.add_argument('--each-option', action = 'store_true', help = _("also profile with every Markdown option changed in turn"))
+	parser.add_argument('--repeat', type = int, default = 1, help = _("number of conversions per profile"))
+	parser.add_argument('--cprofile', metavar = 'FILE', help = _("write cProfile statistics to FILE"))
+	parser.add_argument('--flamegraph', metavar = 'FILE', help = _("write folded stacks for flamegraph.pl to FILE"))
+	_add_option_arguments(parser)
+	parser.add_argument('source', help = _("Markdown file"))
+	args = parser.parse_args(argv)
+
+	profile(args.source, _parsed_options(args), args.each_option, max(1, args.repeat), sys.stdout, args.cprofile, args.flamegraph)
+	return 0
@@ -38,6 +38,7 @@ setup(
 	long_description = mdview.__doc__,
 	url = mdview.__url__,
 	platforms = ['Linux'],
+	py_modules = ['mdview_core'],
 	scripts = ['mdview.py'],
 	cmdclass = {'install': install_noegg, 'sdist': sdist_nopot},
 )
@@ -0,0 +1,38 @@
+import os, sys, time, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mdview_core import BlockRenderer, BlockSplitter
+
+
+class BlockSplitterTest (unittest.TestCase) :
+
+	def feed (self, chunks) :
+		splitter = BlockSplitter()
+		blocks = [block for chunk in chunks for block in splitter.feed(chunk)]
+		return blocks + splitter.finish()
+
+	def test_matches_split (self) :
+		text = "1. a\n\n2. b\n\npara\n\n<div>\n\nx\n\n</div>\n\n```\ncode\n\nmore\n```\n\n> q\n\n> r\n\nend\r\n\r\nlast\n"
+		for size in (1, 2, 3, 7, len(text)) :
+			chunks = [text[i:i + size] for i in range(0, len(text), size)]
+			self.assertEqual(self.feed(chunks), BlockRenderer(None).split(text))
+
+	def test_list_items_stay_grouped (self) :
+		splitter = BlockSplitter()
+		self.assertEqual(splitter.feed("1. a\n\n"), [])
+		self.assertEqual(splitter.feed("2. b\n\n"), [])
+		self.assertEqual(splitter.feed("3. c\n\nafter\n"), ["1. a\n\n2. b\n\n3. c"])
+
+	def test_open_fence (self) :
+		splitter = BlockSplitter()
+		self.assertEqual(splitter.feed("intro\n\n```\n"), ["intro"])
+		chunk = "".join("line {0}\n\n".format(n) for n in range(4000))
+		start = time.time()
+		for n in range(20) : self.assertEqual(splitter.feed(chunk), [])
+		self.assertLess(time.time() - start, 5)
+		self.assertEqual(splitter.feed("```\n\nafter\n"), ["```\n" + "\n\n".join(chunk.strip('\n') for n in range(20)) + "\n\n```"])
+		self.assertEqual(splitter.finish(), ["after"])
+
+
+if __name__ == '__main__' : unittest.main()